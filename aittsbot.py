@@ -1,114 +1,497 @@
 import os
+import time
+import socket
+
+# Отсчет времени запуска — до тяжелых импортов
+PROCESS_START = time.perf_counter()
+
 import asyncio
+import logging
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from telegram import Update
-from telegram.ext import Application, CommandHandler, CallbackContext
-from TTS.api import TTS
-import concurrent.futures
-import gc
-from queue import Queue
+from telegram import Update, ReplyParameters
+from telegram.ext import Application, CommandHandler, CallbackContext, TypeHandler
 from config import load_config
-# from collections import deque  # Закомментируем импорт, так как он нужен только для RateLimiter
-
-# Пытаемся импортировать psutil один раз при запуске
-try:
-    import psutil
-    HAS_PSUTIL = True
-except ImportError:
-    HAS_PSUTIL = False
-    print("psutil не установлен. Мониторинг памяти будет недоступен.")
-
-# Загрузка конфигурации
-config = load_config()
-
-class AudioTask:
-    """Класс для хранения задания на генерацию аудио"""
-    def __init__(self, text, update, status_message=None, created_at=None):
-        self.text = text
-        self.update = update
-        self.status_message = status_message
-        self.created_at = created_at or datetime.now()
-
-# class RateLimiter:
-#     """Класс для контроля частоты запросов"""
-#     def __init__(self, max_requests: int, period: timedelta):
-#         self.max_requests = max_requests
-#         self.period = period
-#         self.requests = deque()
-#
-#     def allow(self) -> bool:
-#         now = datetime.now()
-#         while self.requests and now - self.requests[0] > self.period:
-#             self.requests.popleft()
-#         if len(self.requests) < self.max_requests:
-#             self.requests.append(now)
-#             return True
-#         return False
+from task_store import AudioTask, TaskStore
+from text_processing import MIN_SEGMENT_CHARS, normalize_for_speech, split_sentences
+from audio_encoding import crossfade_concat
+from result_cache import ResultCache
+from voice_registry import VoiceRegistry
+from metrics import StageTimings, Registry, ProcessCollector, format_timings
+from structured_logging import setup_logging
+from memory_governor import MemoryGovernor
+from eta_model import SynthesisTimeModel, estimate_completion, format_eta
+from synthesis_pool import SynthesisPool
+from status_updater import StatusUpdater
+import tts_engine
+from tts_engine import SynthesisResult
+
+logger = logging.getLogger("aittsbot")
+
+# Загрузка конфигурации (путь можно переопределить, например для нагрузочных тестов)
+config = load_config(os.environ.get("BOT_CONFIG", "config.json"))
 
 class BotManager:
     def __init__(self):
-        self.is_processing = False
-        self.tts = None
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-        self.tasks_queue = Queue(maxsize=config.max_queue_size)
+        self.pool = SynthesisPool(config)
+        self.node_id = config.node_id or f"{socket.gethostname()}-{config.role}"
+        self.task_store = self._open_task_store()
+        self.maintenance_task = None
+        self.bot = None
+        self.tts_ready = False
+        self.loading_task = None
+        self.metrics_runner = None
+        self.startup_timings = {}
+        self.status_updater = StatusUpdater(
+            max_edits=config.status_edits_per_second, period=timedelta(seconds=1)
+        )
         self.queue_processor_running = False
-        self.memory_usage_cache = {"value": None, "timestamp": None}
-        self.current_task = None
+        self.queue_event = asyncio.Event()
+        self.stage_timings = StageTimings()
+        self.process_collector = ProcessCollector()
+        self.memory_governor = MemoryGovernor(config.worker_memory_limit_mb, config.synthesis_mb_per_char)
+        self.synthesis_model = SynthesisTimeModel(config.eta_overhead_seconds, config.eta_seconds_per_char)
+        self.profile_request = None  # {"remaining", "mode", "chat_id"}, пока администратор включил /profile
+        self.result_cache = None
+        self.voices = VoiceRegistry(config.voices_dir, config.path_default_sempl_voice, config.default_voice)
+        self.model_version = tts_engine.model_version()
+        if config.result_cache_enabled:
+            self.result_cache = ResultCache(
+                config.result_cache_path,
+                max_entries=config.result_cache_max_entries,
+                max_age_days=config.result_cache_max_age_days
+            )
         # self.rate_limiter = RateLimiter(max_requests=10, period=timedelta(seconds=1))
+        self._init_metrics()
+
+    def _init_metrics(self):
+        """Метрики для /metrics. На пути генерации только инкременты счетчиков,
+        остальное (глубина очереди, гистограммы этапов, RSS, CPU) считывается при опросе."""
+        self.metrics = Registry()
+        self.tasks_total = self.metrics.counter(
+            "aittsbot_tasks_total", "Запросы /gen по результату", ("result",)
+        )
+        self.telegram_errors = self.metrics.counter(
+            "aittsbot_telegram_errors_total", "Ошибки вызовов Bot API", ("method",)
+        )
+        self.telegram_retries = self.metrics.counter(
+            "aittsbot_telegram_retries_total", "Повторные попытки вызовов Bot API", ("method",)
+        )
+        self.metrics.gauge("aittsbot_queue_depth", "Задания, ожидающие воркера",
+                           func=self.task_store.count_pending)
+        self.metrics.gauge("aittsbot_tasks_in_progress", "Задания, которые сейчас генерируются",
+                           func=self._busy_slots)
+        self.metrics.gauge("aittsbot_workers", "Воркеры синтеза по состоянию", ("state",),
+                           func=self._worker_states)
+        self.metrics.counter("aittsbot_status_edits_total", "Правки статусных сообщений по исходу", ("result",),
+                             func=lambda: self.status_updater.stats)
+        self.metrics.counter("aittsbot_result_cache_lookups_total", "Обращения к кэшу результатов", ("result",),
+                             func=self._result_cache_lookups)
+        self.metrics.gauge("aittsbot_startup_seconds", "События запуска, секунды от старта процесса", ("event",),
+                           func=lambda: self.startup_timings)
+        # Объект замеров могут подменить (нагрузочный тест), поэтому берем текущий при опросе
+        self.metrics.register(lambda: self.stage_timings.collect())
+        self.metrics.register(self.process_collector)
+        self.metrics.counter("aittsbot_worker_recycles_total", "Перезапуски воркеров по потолку памяти",
+                             func=lambda: self.memory_governor.recycles)
+        self.metrics.gauge("aittsbot_backlog_seconds", "Оценка времени до выполнения всех заданий очереди",
+                           func=self._backlog_seconds)
+        self.metrics.gauge("aittsbot_eta_model", "Коэффициенты модели времени задания: a + b * символы",
+                           ("coefficient",), func=lambda: {"intercept": self.synthesis_model.intercept,
+                                                           "slope": self.synthesis_model.slope})
+        self.metrics.gauge("aittsbot_synthesis_mb_per_char", "Оценка прироста памяти воркера на символ текста",
+                           func=lambda: self.memory_governor.mb_per_char)
+        self.metrics.gauge("aittsbot_synthesis_overhead_mb", "Оценка постоянного прироста памяти воркера за синтез",
+                           func=lambda: self.memory_governor.overhead_mb)
+        self.metrics.counter("aittsbot_voice_latents_total", "Обращения к латентам голосов и их загрузки в воркерах",
+                             ("result",), func=self._latents_stats)
+        self.metrics.gauge("aittsbot_voice_latents_cached", "Голоса с латентами в памяти воркеров",
+                           func=lambda: sum(len(worker.latents.get("voices", ())) for worker in self.pool.workers))
+
+    def _latents_stats(self) -> dict:
+        """Счетчики кэша латентов голосов, суммарно по воркерам"""
+        stats = dict.fromkeys(("hit", "miss", "disk", "computed"), 0)
+        for worker in self.pool.workers:
+            for key in stats:
+                stats[key] += worker.latents.get(key, 0)
+        return stats
+
+    def _worker_states(self) -> dict:
+        states = dict.fromkeys(("loading", "idle", "busy", "recycling", "error"), 0)
+        for worker in self.pool.workers:
+            states[worker.state] = states.get(worker.state, 0) + 1
+        return states
+
+    def _result_cache_lookups(self):
+        if self.result_cache is None:
+            return None
+        return {"hit": self.result_cache.hits, "miss": self.result_cache.misses}
+
+    def _open_task_store(self):
+        """Общая очередь заданий: SQLite-файл или Redis для узлов на разных машинах"""
+        options = dict(node_id=self.node_id, lease_seconds=config.lease_seconds, max_attempts=config.max_attempts)
+        if config.broker == "redis":
+            from redis_store import RedisTaskStore
+            return RedisTaskStore(config.broker_url, **options)
+        return TaskStore(config.queue_db_path, **options)
+
+    @property
+    def is_ready(self) -> bool:
+        """Есть ли кому генерировать: свои воркеры или, для фронтенда, живые узлы-воркеры"""
+        if config.role == "frontend":
+            return any(
+                self._node_alive(age) and (info["workers"].get("idle", 0) or info["workers"].get("busy", 0))
+                for _, age, info in self.task_store.nodes()
+            )
+        return self.tts_ready
+
+    @staticmethod
+    def _node_alive(heartbeat_age: float) -> bool:
+        return heartbeat_age < 3 * config.heartbeat_interval
+
+    def _node_info(self) -> dict:
+        return {
+            "role": config.role,
+            "workers": self._worker_states(),
+            "busy_tasks": len(self.pool.busy_tasks()),
+            "tasks_done": sum(worker.tasks_done for worker in self.pool.workers),
+            "recycles": self.memory_governor.recycles,
+            "eta": self.synthesis_model.to_dict(),
+        }
+
+    async def _broker_call(self, fn, *args):
+        """Вызов общей очереди из цикла событий.
+
+        Запросы к сетевому брокеру (Redis) выполняются в потоке и не блокируют цикл;
+        SQLite-файл локален, а его соединение привязано к потоку цикла.
+        """
+        if self.task_store.remote:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def _broker_maintenance(self):
+        """Heartbeat узла, продление аренды своих заданий, возврат заданий упавших узлов и опрос очереди"""
+        last_heartbeat = last_eta_refresh = 0.0
+        while True:
+            try:
+                now = time.monotonic()
+                if now - last_heartbeat >= config.heartbeat_interval:
+                    last_heartbeat = now
+                    await self._broker_call(self.task_store.heartbeat, self._node_info())
+                    await self._broker_call(
+                        self.task_store.extend_leases, [task.task_id for task in self.pool.busy_tasks()]
+                    )
+                    for task in await self._broker_call(self.task_store.requeue_expired):
+                        await self._fail_abandoned_task(task)
+                
+                pending = await self._broker_call(self.task_store.count_pending)
+                # Оценки в статусах ожидающих заданий стареют и без завершения заданий;
+                # общую очередь целиком обновляет один узел, а не каждый
+                if config.role != "frontend" and now - last_eta_refresh >= config.eta_refresh_interval:
+                    last_eta_refresh = now
+                    if pending and await self._broker_call(self._leads_eta_refresh):
+                        self._refresh_queue_positions()
+                
+                # Узел-воркер не получает /gen и узнает о новых заданиях только опросом очереди
+                if self.pool.get_idle_worker() is not None and pending:
+                    self._kick_queue()
+            except Exception:
+                logger.exception("Ошибка обслуживания очереди заданий")
+            await asyncio.sleep(config.broker_poll_interval)
+
+    async def _fail_abandoned_task(self, task: AudioTask):
+        """Задание исчерпало попытки: узлы, бравшие его, перестали продлевать аренду"""
+        logger.error("Задание снято после исчерпания попыток", extra={"task_id": task.task_id, "attempts": task.attempts})
+        self.tasks_total.inc(result="failed")
+        try:
+            await self._notify(task, "🚫 Не удалось сгенерировать аудио: обработка несколько раз прерывалась.")
+        except Exception as e:
+            logger.warning("Не удалось уведомить пользователя об ошибке: %s", e, extra={"task_id": task.task_id})
+
+    async def _requeue_interrupted(self, task: AudioTask):
+        """Процесс воркера упал посреди задания: задание возвращается в очередь, пока не исчерпаны попытки"""
+        if not self.task_store.requeue(task):
+            await self._fail_abandoned_task(task)
+            return
+        logger.warning("Задание возвращено в очередь после падения воркера", extra={
+            "task_id": task.task_id, "attempts": task.attempts
+        })
+        self._edit_status(task, "⏳ Воркер синтеза перезапускается, задание возвращено в очередь...")
+
+    def _leads_eta_refresh(self) -> bool:
+        """Обновляет ли этот узел оценки в статусах по таймеру: ведущий — живой узел-воркер с наименьшим node_id"""
+        live = [
+            node_id
+            for node_id, age, info in self.task_store.nodes()
+            if self._node_alive(age) and info["role"] != "frontend"
+        ]
+        return not live or min(live) == self.task_store.node_id
+
+    def _eta_model(self) -> SynthesisTimeModel:
+        """Модель времени задания: своя у узла с воркерами, у фронтенда — средняя по узлам-воркерам"""
+        if config.role != "frontend":
+            return self.synthesis_model
+        weighted = [
+            (info["eta"], sum(info["workers"].values()))
+            for _, age, info in self.task_store.nodes()
+            if self._node_alive(age) and info.get("eta") and info["role"] != "frontend"
+        ]
+        total = sum(weight for _, weight in weighted)
+        if not total:
+            return self.synthesis_model
+        return SynthesisTimeModel(
+            sum(eta["intercept"] * weight for eta, weight in weighted) / total,
+            sum(eta["slope"] * weight for eta, weight in weighted) / total
+        )
+
+    def _worker_capacity(self) -> int:
+        """Сколько воркеров разбирают общую очередь по heartbeat узлов; до первого heartbeat — свои"""
+        capacity = sum(
+            count
+            for _, age, info in self.task_store.nodes()
+            if self._node_alive(age) and info["role"] != "frontend"
+            for state, count in info["workers"].items() if state != "error"
+        )
+        return capacity or max(1, len(self.pool.workers) or config.synthesis_workers)
+
+    def _completion_estimates(self, include_task_id: int = None):
+        """Ожидающие задания в порядке выдачи и оценка секунд до готовности каждого задания"""
+        ordered = self.task_store.ordered_pending(include_task_id=include_task_id)
+        etas = estimate_completion(
+            self.task_store.running_tasks(), ordered, self._worker_capacity(), self._eta_model().predict
+        )
+        return ordered, etas
+
+    def _backlog_seconds(self) -> float:
+        """Через сколько секунд по оценке освободится очередь"""
+        _, etas = self._completion_estimates()
+        return max(etas.values(), default=0.0)
+
+    def _observe_job_time(self, chars: int, timings: dict, start_time: float):
+        """Учитывает время занятости воркера заданием или пакетом в модели ETA"""
+        if "synthesis" in timings:
+            self.synthesis_model.observe(chars, time.perf_counter() - start_time)
 
     def initialize_tts(self):
-        """Загрузка TTS модели при запуске"""
+        """Запуск воркеров синтеза, каждый загружает свою копию TTS модели"""
         try:
-            print("Загрузка TTS модели для CPU...")
-            
-            if not os.path.exists(config.path_default_sempl_voice):
-                print(f"ОШИБКА: Файл с голосом {config.path_default_sempl_voice} не найден!")
-                raise FileNotFoundError(f"Файл с голосом {config.path_default_sempl_voice} не найден")
-            
-            gc.collect()
-            
-            # Минимальная инициализация TTS
-            self.tts = TTS(
-                model_name="tts_models/multilingual/multi-dataset/xtts_v2",
-                progress_bar=False,
-                gpu=False
-            )
-            
-            print("TTS модель успешно загружена и готова к использованию")
+            logger.info("Запуск воркеров синтеза", extra={"workers": config.synthesis_workers})
+            for info in self.pool.start():
+                self.memory_governor.observe_baseline(info.get("rss_mb", 0.0))
+            self.tts_ready = True
+            logger.info("TTS модели успешно загружены и готовы к использованию")
         except Exception as e:
-            print(f"Ошибка инициализации TTS: {e}")
+            logger.error("Ошибка инициализации TTS: %s", e)
             raise e
 
-    def generate_audio(self, text: str) -> str:
-        """Генерация аудиофайла"""
+    async def load_tts(self):
+        """Фоновая загрузка моделей: бот уже принимает команды, задания ждут в очереди"""
+        logger.info("Фоновый запуск воркеров синтеза", extra={"workers": config.synthesis_workers})
+        await asyncio.gather(*(
+            self._await_worker(worker, future) for worker, future in self.pool.launch()
+        ))
+        self._mark_startup("all_workers_ready")
+        if not self.tts_ready:
+            logger.error("Не удалось запустить ни одного воркера синтеза")
+
+    async def _await_worker(self, worker, future):
+        """Ждет загрузки и прогрева модели в воркере и сразу отдает ему задания"""
+        await asyncio.wait([asyncio.wrap_future(future)])
+        info = self.pool.finish_start(worker, future)
+        if info is None:
+            return
+        self.memory_governor.observe_baseline(info.get("rss_mb", 0.0))
+        
+        if not self.tts_ready:
+            self.tts_ready = True
+            self._mark_startup("first_worker_ready")
+            if "warmup" in info:
+                self.startup_timings["warmup"] = info["warmup"]
+        self._kick_queue()
+
+    def _segment_chars(self) -> int:
+        """Длина сегмента: окно токенов модели и ожидаемый пик памяти воркера.
+
+        Не короче предложения: если память не вмещает и его, дробить текст дальше
+        бесполезно — такой воркер переработает лимит и будет перезапущен.
+        """
+        limit = min(MIN_SEGMENT_CHARS, config.segment_max_chars)
+        return max(limit, self.memory_governor.max_chars(config.segment_max_chars))
+
+    def _segments(self, text: str) -> list:
+        """Текст в произносимом виде, разрезанный по предложениям и клаузам на сегменты"""
+        speech_text = normalize_for_speech(text)
+        return split_sentences(speech_text, max_chars=self._segment_chars()) or [speech_text]
+
+    def _observe_memory(self, chars: int, timings: dict, result: SynthesisResult):
+        """Учитывает замер RSS воркера за синтез в замерах задания и оценке памяти"""
+        if not result.memory:
+            return
+        timings["rss_peak_mb"] = max(timings.get("rss_peak_mb", 0.0), result.memory["peak"])
+        timings["rss_after_mb"] = result.memory["after"]
+        self.memory_governor.observe(chars, result.memory)
+
+    def _maybe_recycle(self, worker, rss_after_mb: float):
+        """Перезапускает воркер, если после задания его RSS выше потолка.
+
+        Воркер сразу выходит из числа свободных, поэтому новых заданий не получит;
+        ожидающие задания остаются в очереди и достанутся другим воркерам или ему же после перезапуска.
+        """
+        if not self.memory_governor.should_recycle(rss_after_mb):
+            return
+        self.memory_governor.recycles += 1
+        worker.state = "recycling"
+        logger.warning("Потолок памяти превышен, перезапускаю воркер", extra={
+            "worker_id": worker.worker_id, "rss_mb": round(rss_after_mb, 1),
+            "limit_mb": config.worker_memory_limit_mb
+        })
+        asyncio.create_task(self._recycle_worker(worker))
+
+    def _restart_broken_worker(self, worker) -> bool:
+        """Перезапускает воркер, чей процесс завершился аварийно; True, если перезапуск начат.
+
+        Исполнитель такого воркера больше не принимает задачи, поэтому в число
+        свободных он возвращается только после перезапуска.
+        """
+        if not worker.broken:
+            return False
+        worker.state = "recycling"
+        logger.error("Процесс воркера синтеза завершился аварийно, перезапускаю", extra={"worker_id": worker.worker_id})
+        asyncio.create_task(self._recycle_worker(worker))
+        return True
+
+    async def _recycle_worker(self, worker):
+        loop = asyncio.get_running_loop()
         try:
-            os.makedirs("temp_audio", exist_ok=True)
-            filename = os.path.join("temp_audio", f"audio_{datetime.now().strftime('%Y%m%d%H%M%S')}.wav")
-            
-            if len(text) > config.max_text_length:
-                text = text[:config.max_text_length]
-            
-            text = text.replace('\n', ' ').replace('\r', ' ')
-            
-            print(f"Начало непосредственной генерации текста: {text[:50]}...")
-            
-            self.tts.tts_to_file(
-                text=text,
-                file_path=filename,
-                speaker_wav=config.path_default_sempl_voice,
-                language="ru"
-            )
-            
-            if not os.path.exists(filename) or os.path.getsize(filename) == 0:
-                print(f"Ошибка: файл {filename} не создан или пустой")
-                return None
-            
-            return filename
+            # Остановка процесса ждет завершения его работы, поэтому выполняется вне цикла событий
+            ready = await loop.run_in_executor(None, worker.restart, config)
         except Exception as e:
-            print(f"Ошибка генерации аудио: {e}")
-            import traceback
-            traceback.print_exc()
+            worker.state = "error"
+            logger.error("Не удалось перезапустить воркер: %s", e, extra={"worker_id": worker.worker_id})
+            return
+        await self._await_worker(worker, ready)
+
+    def _mark_startup(self, event: str):
+        """Запоминает, через сколько секунд после старта процесса произошло событие запуска"""
+        if event not in self.startup_timings:
+            self.startup_timings[event] = time.perf_counter() - PROCESS_START
+            logger.info("Событие запуска", extra={"event": event, "seconds": round(self.startup_timings[event], 3)})
+
+    async def on_any_update(self, update: Update, context: CallbackContext):
+        """Отмечает первое обновление после старта; обработку не прерывает"""
+        self._mark_startup("first_update")
+
+    def _kick_queue(self):
+        """Будит диспетчер очереди или запускает его, если он не работает"""
+        self.queue_event.set()
+        if not self.queue_processor_running:
+            # Флаг ставим сразу, чтобы два вызова подряд не запустили два диспетчера
+            self.queue_processor_running = True
+            asyncio.create_task(self.process_queue())
+
+    def _result_cache_key(self, text: str, voice: str):
+        """Ключ кэша результатов или None, если кэш выключен"""
+        if self.result_cache is None:
+            return None
+        voice_hash = self.voices.sample_hash(voice)
+        if voice_hash is None:
             return None
+        return ResultCache.make_key(text, voice_hash, tts_engine.LANGUAGE, self.model_version,
+                                    config.inference_precision, config.hifigan_backend)
+
+    async def _reply_from_cache(self, update: Update, cache_key: str) -> bool:
+        """Повторно отправляет готовое аудио по file_id; True при успехе"""
+        cached = self.result_cache.get(cache_key)
+        if cached is None:
+            return False
+        
+        file_id, kind = cached
+        try:
+            if kind == "voice":
+                await update.message.reply_voice(voice=file_id)
+            else:
+                await update.message.reply_audio(audio=file_id)
+            return True
+        except Exception as e:
+            # file_id мог стать недействительным — удаляем запись и генерируем заново
+            logger.warning("Не удалось отправить аудио из кэша: %s", e)
+            self.telegram_errors.inc(method="sendVoice" if kind == "voice" else "sendAudio")
+            self.result_cache.remove(cache_key)
+            return False
+
+    def _busy_slots(self) -> int:
+        """Количество заданий, которые сейчас генерируются воркерами на всех узлах"""
+        return self.task_store.count_running()
+
+    def _batching_enabled(self) -> bool:
+        # Потоковый режим синтезирует по предложениям и в пакеты не объединяется
+        return config.max_batch_size > 1 and not config.streaming_mode
+
+    def _claim_tasks(self) -> list:
+        """Забирает из очереди одно задание или пакет заданий близкой длины"""
+        if self._batching_enabled():
+            return self.task_store.claim_batch(
+                config.max_batch_size, config.batch_max_chars, config.batch_bucket_chars
+            )
+        task = self.task_store.claim_next()
+        return [task] if task else []
+
+    async def _wait_for_batch(self):
+        """Короткое окно, за которое в очередь успевают прийти попутчики для пакета"""
+        if not self._batching_enabled() or self.pool.get_idle_worker() is None:
+            return
+        pending = self.task_store.count_pending()
+        if 0 < pending < config.max_batch_size:
+            delay = config.batch_window_ms / 1000 - self.task_store.oldest_pending_age()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _reply_parameters(task: AudioTask) -> ReplyParameters:
+        # Исходное сообщение могли удалить, пока задание ждало в очереди
+        return ReplyParameters(message_id=task.message_id, allow_sending_without_reply=True)
+
+    def _edit_status(self, task: AudioTask, text: str):
+        """Ставит правку статусного сообщения задания в фоновый обновлятор, не дожидаясь Telegram"""
+        if task.status_message_id:
+            self.status_updater.request(task.chat_id, task.status_message_id, text)
+
+    async def _notify(self, task: AudioTask, text: str):
+        """Сообщает пользователю о результате через статусное сообщение или ответом"""
+        if task.status_message_id:
+            self._edit_status(task, text)
+        else:
+            await self.bot.send_message(task.chat_id, text, reply_parameters=self._reply_parameters(task))
+
+    async def resume_pending(self, bot):
+        """Продолжает обработку заданий, сохраненных до перезапуска"""
+        self.bot = bot
+        self.status_updater.start(bot)
+        recovered = self.task_store.recover()
+        pending = self.task_store.count_pending()
+        if recovered:
+            logger.info("Возвращены в очередь прерванные задания", extra={"tasks": recovered})
+        if pending:
+            logger.info("Продолжаю обработку сохраненных заданий", extra={"tasks": pending})
+            self._refresh_queue_positions()
+            self._kick_queue()
+
+    async def startup(self, bot):
+        """Старт узла: продолжаем очередь и загружаем модели в фоне, не блокируя прием команд.
+
+        Фронтенд (role = frontend) моделей не загружает и только ставит задания в общую очередь.
+        """
+        self._mark_startup("accepting_updates")
+        await self.resume_pending(bot)
+        # /metrics всегда на отдельном внутреннем порту, а не на публичном listener webhook
+        if config.metrics_port:
+            from metrics_server import start_metrics_server
+            self.metrics_runner = await start_metrics_server(
+                self.metrics, config.metrics_listen, config.metrics_port, in_thread=self.task_store.remote
+            )
+        if config.role != "frontend":
+            self.loading_task = asyncio.create_task(self.load_tts())
+        self.maintenance_task = asyncio.create_task(self._broker_maintenance())
 
     async def gen_command(self, update: Update, context: CallbackContext):
         """Обработчик команды /gen"""
@@ -118,270 +501,774 @@ class BotManager:
         #     await update.message.reply_text("⚠️ Слишком много запросов. Пожалуйста, подождите немного.")
         #     return
 
+        # Голос выбирается первым аргументом: /gen voice=<имя> текст
+        args = list(context.args or [])
+        voice = self.voices.default
+        if args and args[0].lower().startswith("voice="):
+            voice = self.voices.canonical(args.pop(0)[len("voice="):])
+            if voice is None:
+                await update.message.reply_text(
+                    "🎙 Такого голоса нет. Доступные голоса: " + ", ".join(self.voices.names())
+                )
+                self.tasks_total.inc(result="rejected_unknown_voice")
+                return
+        
         # Проверяем наличие и минимальную длину текста
-        if not context.args or len(" ".join(context.args)) < config.min_text_length:
+        if not args or len(" ".join(args)) < config.min_text_length:
             await update.message.reply_text(f"📝 Минимум {config.min_text_length} символа")
+            self.tasks_total.inc(result="rejected_too_short")
+            return
+
+        # Повторяющиеся фразы отправляем из кэша, не занимая слот очереди
+        max_length = config.max_text_length
+        cache_key = self._result_cache_key(" ".join(args)[:max_length], voice)
+        if cache_key and await self._reply_from_cache(update, cache_key):
+            self.tasks_total.inc(result="cache_hit")
+            return
+
+        # Один пользователь не может занять всю очередь
+        user = update.effective_user
+        if await self._broker_call(self.task_store.count_user_active, user.id) >= config.max_tasks_per_user:
+            await update.message.reply_text(
+                f"⚠️ У вас уже {config.max_tasks_per_user} задания в очереди. "
+                f"Дождитесь их выполнения и попробуйте снова."
+            )
+            self.tasks_total.inc(result="rejected_user_limit")
             return
 
         # Проверяем доступность очереди
-        # Подсчитываем занятые слоты: задания в очереди + текущее обрабатываемое
-        total_slots_used = self.tasks_queue.qsize() + (1 if self.is_processing else 0)
+        # Подсчитываем занятые слоты: задания в очереди + обрабатываемые воркерами
+        total_slots_used = await self._broker_call(lambda: self.task_store.count_pending() + self._busy_slots())
         
         if total_slots_used >= config.max_queue_size:
             await update.message.reply_text(
                 f"🔴 Очередь заполнена (максимум {config.max_queue_size} заданий). "
                 f"Пожалуйста, попробуйте позже или используйте команду /status для проверки состояния очереди."
             )
+            self.tasks_total.inc(result="rejected_queue_full")
             return
+        
+        # Лимит очереди по оценке работы, а не по числу заданий
+        if config.max_backlog_seconds:
+            backlog = await self._broker_call(self._backlog_seconds)
+            if backlog > config.max_backlog_seconds:
+                await update.message.reply_text(
+                    f"🔴 Очередь загружена: текущие задания будут готовы через {format_eta(backlog)}. "
+                    f"Пожалуйста, попробуйте позже."
+                )
+                self.tasks_total.inc(result="rejected_backlog")
+                return
 
         # Подготовка и обрезка текста ДО отправки в генерацию
-        user_text = " ".join(context.args)
+        user_text = " ".join(args)
         
         # Обрезаем текст, если он превышает лимит
         original_length = len(user_text)
-        if original_length > config.max_text_length:
-            user_text = user_text[:config.max_text_length]
+        if original_length > max_length:
+            user_text = user_text[:max_length]
             # Информируем пользователя об обрезке текста
             await update.message.reply_text(
-                f"⚠️ Ваш текст был обрезан с {original_length} до {config.max_text_length} символов."
+                f"⚠️ Ваш текст был обрезан с {original_length} до {max_length} символов."
             )
         
-        # Отправляем сообщение о добавлении в очередь
-        # Показываем корректную позицию, учитывая текущий генерируемый файл и все задания в очереди
-        queue_size = self.tasks_queue.qsize()
+        # Сохраняем задание; планировщик увидит его только после отправки статусного сообщения
+        task = AudioTask(
+            text=user_text,
+            chat_id=update.effective_chat.id,
+            message_id=update.message.message_id,
+            user_id=user.id,
+            user_name=user.first_name,
+            cache_key=cache_key,
+            voice=voice
+        )
+        await self._broker_call(self.task_store.add, task)
+        
+        # Позиция и оценка готовности считаются по справедливому порядку
+        # с учетом заданий, которые уже генерируются воркерами
+        def estimate():
+            ordered, etas = self._completion_estimates(include_task_id=task.task_id)
+            return ordered, etas, self._busy_slots()
+        
+        ordered, etas, busy_slots = await self._broker_call(estimate)
+        real_position = [queued.task_id for queued in ordered].index(task.task_id) + 1 + busy_slots
+        eta = etas[task.task_id]
         
-        # Вычисляем реальную позицию: если есть обрабатываемое задание, то +1 к позиции
-        real_position = queue_size + 1 + (1 if self.is_processing else 0)
+        # Задание, которое не успеет к дедлайну, отклоняем сразу, а не после долгого ожидания
+        if config.max_wait_seconds and eta > config.max_wait_seconds:
+            await self._broker_call(self.task_store.remove, task)
+            await update.message.reply_text(
+                f"⌛ Сейчас генерация займет {format_eta(eta)}, это дольше допустимых "
+                f"{format_eta(config.max_wait_seconds)}. Попробуйте позже или сократите текст."
+            )
+            self.tasks_total.inc(result="rejected_deadline")
+            return
 
-        status_message = await update.message.reply_text(
-            f"⏳ Задание добавлено в очередь. Позиция в очереди: {real_position}."
-        )
+        queued_text = (f"⏳ Задание добавлено в очередь. Позиция в очереди: {real_position}. "
+                       f"Готовность примерно через {format_eta(eta)}.")
+        if not self.is_ready:
+            queued_text += " Модель загружается, генерация начнется сразу после загрузки."
+        try:
+            status_message = await update.message.reply_text(queued_text)
+        except Exception:
+            await self._broker_call(self.task_store.remove, task)
+            raise
         
-        # Создаем и добавляем задание в очередь
-        task = AudioTask(text=user_text, update=update, status_message=status_message)
-        self.tasks_queue.put(task)
+        # Делаем задание доступным планировщику
+        task.status_message_id = status_message.message_id
+        await self._broker_call(self.task_store.activate, task)
+        self.tasks_total.inc(result="queued")
+        # Новое задание может встать в честном порядке перед уже ожидающими: их позиции и оценки сдвигаются
+        self._refresh_queue_positions()
+        logger.info("Задание добавлено в очередь", extra={
+            "task_id": task.task_id, "user_id": task.user_id, "chars": len(task.text), "position": real_position,
+            "voice": task.voice, "eta": round(eta, 1)
+        })
         
-        # Запускаем обработчик очереди, если он еще не запущен
-        if not self.queue_processor_running:
-            asyncio.create_task(self.process_queue())
+        # Будим диспетчер или запускаем его, если он еще не запущен
+        self._kick_queue()
 
     async def process_queue(self):
-        """Асинхронный обработчик очереди заданий с защитой от зависания при ошибках"""
+        """Диспетчер очереди: раздает задания свободным воркерам синтеза"""
         self.queue_processor_running = True
-        self.current_task = None  # Добавляем отслеживание текущей задачи
+        running = set()
         
-        while not self.tasks_queue.empty():
-            task = None
-            try:
-                # Получаем задание из очереди
-                task = self.tasks_queue.get()
-                self.current_task = task  # Сохраняем текущую задачу для отображения в статусе
-                
-                # Замеряем время начала обработки
-                # start_time = datetime.now()
-                # print(f"Начало обработки задания в {start_time.strftime('%H:%M:%S.%f')}")
-                
-                # Обновляем статус для текущего задания
-                if task.status_message:
-                    await task.status_message.edit_text("⏳ Начинаю генерацию аудиофайла...")
-                
-                # Устанавливаем флаг занятости
-                self.is_processing = True
-                
-                # Получаем текущий event loop
-                loop = asyncio.get_running_loop()
-                
-                # Запускаем генерацию в отдельном потоке
-                future = self.executor.submit(self.generate_audio, task.text)
-                
-                # Ожидаем завершения генерации с меньшей частотой проверок
-                # На CPU операция может быть долгой, увеличиваем интервал проверки
-                while not future.done():
-                    await asyncio.sleep(1.0)  # Увеличиваем до 1 секунды на CPU
-                
-                # Получаем результат генерации
-                audio_path = future.result()
-                
-                # Замеряем время до отправки
-                # gen_complete_time = datetime.now()
-                # print(f"Время до отправки: {(gen_complete_time - start_time).total_seconds():.2f} сек")
-                
-                # Обрабатываем результат
-                await self.handle_audio_generated(task.update, audio_path, task.status_message)
+        try:
+            while True:
+                await self._wait_for_batch()
                 
-                # Замеряем общее время
-                # end_time = datetime.now()
-                # print(f"Общее время обработки задания: {(end_time - start_time).total_seconds():.2f} сек")
+                # Раздаем задания, пока есть и задания, и свободные воркеры
+                while True:
+                    worker = self.pool.get_idle_worker()
+                    if worker is None:
+                        break
+                    tasks = await self._broker_call(self._claim_tasks)
+                    if not tasks:
+                        break
+                    worker.assign(tasks)
+                    self._prewarm_voices(worker)
+                    if len(tasks) == 1:
+                        running.add(asyncio.create_task(self._process_task(tasks[0], worker)))
+                    else:
+                        running.add(asyncio.create_task(self._process_batch(tasks, worker)))
                 
-            except Exception as e:
-                print(f"Ошибка при обработке задания из очереди: {e}")
+                if not running:
+                    break
                 
-                # Уведомляем пользователя, используя task, если оно определено
+                # Ждем завершения любого задания или поступления нового
+                self.queue_event.clear()
+                waiter = asyncio.create_task(self.queue_event.wait())
+                done, _ = await asyncio.wait(running | {waiter}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                running -= done
+        finally:
+            self.queue_processor_running = False
+
+    async def _process_task(self, task: AudioTask, worker):
+        """Обработка одного задания на выделенном воркере с защитой от зависания при ошибках"""
+        # Замеряем время ожидания в очереди и длительность этапов обработки
+        timings = {"queue_wait": (datetime.now() - task.created_at).total_seconds()}
+        start_time = time.perf_counter()
+        interrupted = False
+        
+        try:
+            # Обновляем статус для текущего задания
+            self._edit_status(task, self._generating_text(len(task.text)))
+            
+            # В потоковом режиме отправляем аудио по сегментам по мере готовности,
+            # иначе длинный текст синтезируется по сегментам и склеивается в одно аудио
+            segments = self._segments(task.text)
+            if config.streaming_mode:
+                await self._process_task_streaming(task, worker, timings, segments)
+                return
+            if len(segments) > 1:
+                await self._process_task_segmented(task, worker, timings, segments)
+                return
+            
+            # Запускаем генерацию в процессе воркера
+            profile = self._take_profile()
+            future = worker.submit(
+                tts_engine.worker_generate_audio, segments[0], task.task_id, task.voice, profile and profile["mode"]
+            )
+            
+            # Ждем результат без опроса: корутина просыпается сразу по завершении синтеза
+            result = await asyncio.wrap_future(future)
+            worker.latents = result.latents
+            self._report_profile(profile, f"задание {task.task_id}", result)
+            timings.update(result.timings)
+            timings["audio_duration"] = result.audio_duration
+            self._observe_memory(len(task.text), timings, result)
+            
+            # Обрабатываем результат
+            await self.handle_audio_generated(task, result, timings=timings)
+            
+        except BrokenProcessPool:
+            logger.exception("Процесс воркера упал во время синтеза", extra={"task_id": task.task_id})
+            interrupted = True
+            
+        except Exception:
+            logger.exception("Ошибка при обработке задания из очереди", extra={"task_id": task.task_id})
+            self.tasks_total.inc(result="failed")
+            
+            # Уведомляем пользователя об ошибке
+            try:
+                await self._notify(task, "🚫 Произошла ошибка при обработке задания.")
+            except Exception as notify_error:
+                logger.warning("Не удалось уведомить пользователя об ошибке: %s", notify_error,
+                               extra={"task_id": task.task_id})
+        
+        finally:
+            if interrupted:
+                await self._requeue_interrupted(task)
+            else:
+                self._finish_task(task, worker, timings, start_time)
+                self._observe_job_time(len(task.text), timings, start_time)
+            
+            # Освобождаем воркер; статус оставшихся заданий обновляется в фоне и не задерживает следующее задание
+            worker.release()
+            if not self._restart_broken_worker(worker):
+                self._maybe_recycle(worker, timings.get("rss_after_mb"))
+            self._refresh_queue_positions()
+
+    async def _process_batch(self, tasks: list, worker):
+        """Обработка пакета коротких заданий одним проходом синтеза на воркере"""
+        start_time = time.perf_counter()
+        all_timings = [
+            {"queue_wait": (datetime.now() - task.created_at).total_seconds(), "batch_size": len(tasks)}
+            for task in tasks
+        ]
+        interrupted = False
+        
+        try:
+            generating_text = self._generating_text(sum(len(task.text) for task in tasks))
+            for task in tasks:
+                self._edit_status(task, generating_text)
+            
+            profile = self._take_profile()
+            future = worker.submit(
+                tts_engine.worker_generate_batch, [normalize_for_speech(task.text) for task in tasks],
+                [task.task_id for task in tasks],
+                [task.voice for task in tasks], profile and profile["mode"]
+            )
+            results = await asyncio.wrap_future(future)
+            worker.latents = results[0].latents
+            self._report_profile(profile, f"пакет {', '.join(str(task.task_id) for task in tasks)}", results[0])
+            for timings, result in zip(all_timings, results):
+                timings.update(result.timings)
+                timings["audio_duration"] = result.audio_duration
+                if result.memory:
+                    timings["rss_peak_mb"] = result.memory["peak"]
+                    timings["rss_after_mb"] = result.memory["after"]
+            # Замер памяти общий на пакет, поэтому в оценку идет один раз по суммарной длине
+            self.memory_governor.observe(sum(len(task.text) for task in tasks), results[0].memory)
+            
+            # Результаты пакета загружаются в Telegram параллельно
+            await asyncio.gather(*(
+                self.handle_audio_generated(task, result, timings=timings)
+                for task, result, timings in zip(tasks, results, all_timings)
+            ))
+            
+        except BrokenProcessPool:
+            logger.exception("Процесс воркера упал во время синтеза пакета",
+                             extra={"task_ids": [task.task_id for task in tasks]})
+            interrupted = True
+            
+        except Exception:
+            logger.exception("Ошибка при обработке пакета заданий из очереди",
+                             extra={"task_ids": [task.task_id for task in tasks]})
+            for task in tasks:
+                self.tasks_total.inc(result="failed")
                 try:
-                    if task and task.status_message:
-                        await task.status_message.edit_text("🚫 Произошла ошибка при обработке задания.")
-                    elif task:
-                        await task.update.message.reply_text("🚫 Произошла ошибка при обработке задания.")
+                    await self._notify(task, "🚫 Произошла ошибка при обработке задания.")
                 except Exception as notify_error:
-                    print(f"Не удалось уведомить пользователя об ошибке: {notify_error}")
-            
-            finally:
-                # Сбрасываем флаг занятости и текущую задачу
-                self.is_processing = False
-                self.current_task = None
-                
-                # Если task было получено, отмечаем задание как выполненное
-                if task is not None:
-                    self.tasks_queue.task_done()
+                    logger.warning("Не удалось уведомить пользователя об ошибке: %s", notify_error,
+                                   extra={"task_id": task.task_id})
+        
+        finally:
+            if interrupted:
+                for task in tasks:
+                    await self._requeue_interrupted(task)
+            else:
+                for task, timings in zip(tasks, all_timings):
+                    self._finish_task(task, worker, timings, start_time)
+                # Пакет занимает воркер целиком, поэтому в модель идет как одно задание суммарной длины
+                self._observe_job_time(sum(len(task.text) for task in tasks), all_timings[0], start_time)
+            worker.release()
+            if not self._restart_broken_worker(worker):
+                self._maybe_recycle(worker, all_timings[0].get("rss_after_mb"))
+            self._refresh_queue_positions()
+
+    def _prewarm_voices(self, worker):
+        """Ставит воркеру прогрев голосов ближайших заданий очереди следом за текущей работой.
+
+        Воркер выполняет задачи по порядку, поэтому латенты загружаются, пока
+        основной процесс отправляет результат, и следующее задание их не ждет.
+        """
+        if len(self.voices) < 2 or not config.voice_prewarm_depth:
+            return
+        resident = set(worker.latents.get("voices", ()))
+        upcoming = self.task_store.ordered_pending()[:config.voice_prewarm_depth]
+        voices = list(dict.fromkeys(
+            task.voice or self.voices.default for task in upcoming
+            if (task.voice or self.voices.default) not in resident
+        ))
+        if voices:
+            asyncio.create_task(self._run_prewarm(worker, voices))
+
+    async def _run_prewarm(self, worker, voices: list):
+        try:
+            worker.latents = await asyncio.wrap_future(worker.submit(tts_engine.worker_prewarm_voices, voices))
+        except Exception as e:
+            logger.warning("Ошибка прогрева голосов: %s", e, extra={"worker_id": worker.worker_id, "voices": voices})
+            # Свободный воркер с упавшим процессом иначе получил бы следующее задание
+            if worker.is_idle:
+                self._restart_broken_worker(worker)
+
+    def _take_profile(self):
+        """Если профилирование включено, забирает одно задание из оставшихся; иначе None"""
+        request = self.profile_request
+        if request is None:
+            return None
+        request["remaining"] -= 1
+        if request["remaining"] <= 0:
+            self.profile_request = None
+        return request
+
+    def _report_profile(self, profile, label: str, result: SynthesisResult):
+        """Отправляет администратору разбивку профиля задания по этапам"""
+        if profile is None or not result.profile:
+            return
+        stages = "\n".join(
+            f"   {stage}: {seconds:.3f} с" for stage, seconds in result.profile["stages"].items() if seconds
+        )
+        text = f"🔬 Профиль ({label}):\n{stages}\n📁 {result.profile['path']}"
+        asyncio.create_task(self._send_admin_message(profile["chat_id"], text))
+
+    async def _send_admin_message(self, chat_id: int, text: str):
+        try:
+            await self.bot.send_message(chat_id, text)
+        except Exception as e:
+            logger.warning("Не удалось отправить результат профилирования: %s", e)
+
+    def _finish_task(self, task: AudioTask, worker, timings: dict, start_time: float):
+        """Записывает замеры этапов и удаляет выполненное задание из очереди"""
+        # Логируем длительность этапов и добавляем их в гистограммы
+        timings["total"] = time.perf_counter() - start_time
+        self.stage_timings.observe(timings, chars=len(task.text))
+        logger.info("Задание обработано", extra={
+            "task_id": task.task_id, "user_id": task.user_id, "worker_id": worker.worker_id,
+            "chars": len(task.text), **{stage: round(value, 3) for stage, value in timings.items()}
+        })
+        
+        self.task_store.complete(task)
+        if task.status_message_id:
+            self.status_updater.forget(task.chat_id, task.status_message_id)
+
+    def _generating_text(self, chars: int) -> str:
+        return f"⏳ Начинаю генерацию аудиофайла, это займет {format_eta(self._eta_model().predict(chars))}..."
+
+    def _refresh_queue_positions(self):
+        """Обновляет позиции ожидающих заданий в порядке, в котором их выдаст планировщик.
+
+        Вместе с позицией показывается оставшееся по оценке время. Неизменившиеся
+        статусы пропускаются, остальные правки объединяются и отправляются
+        StatusUpdater с ограничением частоты. Очередь читается через брокер,
+        поэтому обновление идет фоновой задачей и не задерживает вызывающего.
+        """
+        asyncio.create_task(self._update_queue_positions())
+
+    def _queue_statuses(self) -> list:
+        """Пары (задание, текст статуса) для ожидающих заданий"""
+        remaining_tasks, etas = self._completion_estimates()
+        busy_slots = self._busy_slots()
+        
+        # Важно! Показываем правильное общее количество заданий
+        # Это количество оставшихся в очереди + генерируемые воркерами
+        total_tasks = len(remaining_tasks) + busy_slots
+        
+        # Позиция в очереди: индекс + 1 (для 1-indexed счета) + генерируемые задания
+        return [
+            (queued_task, f"⏳ Ожидание в очереди. Позиция: {idx + 1 + busy_slots} из {total_tasks}. "
+                          f"Готовность примерно через {format_eta(etas[queued_task.task_id])}.")
+            for idx, queued_task in enumerate(remaining_tasks)
+        ]
+
+    async def _update_queue_positions(self):
+        try:
+            for queued_task, text in await self._broker_call(self._queue_statuses):
+                self._edit_status(queued_task, text)
+        except Exception:
+            logger.exception("Ошибка обновления позиций в очереди")
+
+    async def _process_task_segmented(self, task: AudioTask, worker, timings: dict, segments: list):
+        """Длинный текст: сегменты синтезируются параллельно и склеиваются с кроссфейдом в одно аудио.
+
+        Сегменты идут подряд на воркере задания; свободные воркеры подключаются,
+        только пока в очереди нет других заданий, чтобы длинный текст не задерживал чужие.
+        """
+        results = [None] * len(segments)
+        running = {}  # future -> (номер сегмента, воркер)
+        helpers = []
+        rss_after = {}  # воркер -> RSS после его последнего сегмента
+        next_segment = 0
+        profile = self._take_profile()
+        synthesis_start = time.perf_counter()
+        
+        def submit(segment_worker):
+            nonlocal next_segment
+            future = asyncio.wrap_future(segment_worker.submit(
+                tts_engine.worker_synthesize_segment, segments[next_segment], task.task_id, task.voice,
+                profile and profile["mode"]
+            ))
+            running[future] = (next_segment, segment_worker)
+            next_segment += 1
+        
+        try:
+            submit(worker)
+            while running:
+                while next_segment < len(segments) and not self.task_store.count_pending():
+                    helper = self.pool.get_idle_worker()
+                    if helper is None:
+                        break
+                    helper.assign_segments(task)
+                    helpers.append(helper)
+                    submit(helper)
                 
-                # Обновляем статус оставшихся заданий
-                # Для этого нужно будет преобразовать очередь в список временно
-                remaining_tasks = list(self.tasks_queue.queue)
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    idx, segment_worker = running.pop(future)
+                    result = future.result()
+                    segment_worker.latents = result.latents
+                    self._report_profile(profile, f"задание {task.task_id}, сегмент {idx + 1}", result)
+                    if result.wav is None:
+                        raise RuntimeError(f"Не удалось синтезировать сегмент {idx + 1} из {len(segments)}")
+                    results[idx] = result
+                    if result.memory:
+                        # Пик — общий для задания, а RSS после синтеза решает о перезапуске конкретного воркера
+                        timings["rss_peak_mb"] = max(timings.get("rss_peak_mb", 0.0), result.memory["peak"])
+                        rss_after[segment_worker] = result.memory["after"]
+                        self.memory_governor.observe(len(segments[idx]), result.memory)
+                    
+                    if next_segment < len(segments) and (segment_worker is worker or not self.task_store.count_pending()):
+                        submit(segment_worker)
+                    elif segment_worker is not worker:
+                        # Помощник возвращается диспетчеру, как только его ждут другие задания
+                        helpers.remove(segment_worker)
+                        self._release_helper(segment_worker, rss_after.get(segment_worker))
+                        self._kick_queue()
+        finally:
+            for helper in helpers:
+                self._release_helper(helper, rss_after.get(helper))
+            if helpers:
+                self._kick_queue()
+            if worker in rss_after:
+                timings["rss_after_mb"] = rss_after[worker]
+        
+        timings["synthesis"] = time.perf_counter() - synthesis_start
+        timings["segments"] = len(segments)
+        
+        sample_rate = results[0].sample_rate
+        wav = crossfade_concat([result.wav for result in results], sample_rate, config.segment_crossfade_ms)
+        combined = SynthesisResult()
+        # Кодирование вызывает ffmpeg и блокирует, поэтому идет вне цикла событий
+        await asyncio.get_running_loop().run_in_executor(
+            None, tts_engine.encode_audio, config, wav, sample_rate, combined
+        )
+        timings.update(combined.timings)
+        timings["audio_duration"] = combined.audio_duration
+        await self.handle_audio_generated(task, combined, timings=timings)
+
+    def _release_helper(self, helper, rss_after_mb: float):
+        """Возвращает помощника диспетчеру, перезапуская его, если процесс упал или RSS выше потолка"""
+        helper.release()
+        if not self._restart_broken_worker(helper):
+            self._maybe_recycle(helper, rss_after_mb)
+
+    async def _process_task_streaming(self, task: AudioTask, worker, timings: dict, sentences: list):
+        """Синтез по сегментам: первая часть уходит пользователю, не дожидаясь остальных"""
+        # Воркер выполняет задания строго по порядку, поэтому ставим все предложения сразу:
+        # следующее предложение синтезируется, пока отправляется предыдущее
+        stream_start = time.perf_counter()
+        profile = self._take_profile()
+        futures = [
+            worker.submit(tts_engine.worker_generate_audio, sentence, task.task_id, task.voice,
+                          profile and profile["mode"])
+            for sentence in sentences
+        ]
+        
+        try:
+            for part, future in enumerate(futures, start=1):
+                result = await asyncio.wrap_future(future)
+                worker.latents = result.latents
+                self._report_profile(profile, f"задание {task.task_id}, часть {part}", result)
                 
-                # Важно! Показываем правильное общее количество заданий
-                # Это количество оставшихся в очереди + 1 (если идет обработка)
-                total_tasks = len(remaining_tasks) + (1 if self.is_processing else 0)
+                # Время до первой части — главный показатель потокового режима
+                if part == 1:
+                    timings["first_part"] = time.perf_counter() - stream_start
+                for stage, value in result.timings.items():
+                    timings[stage] = timings.get(stage, 0.0) + value
+                timings["audio_duration"] = timings.get("audio_duration", 0.0) + result.audio_duration
+                self._observe_memory(len(sentences[part - 1]), timings, result)
                 
-                for idx, queued_task in enumerate(remaining_tasks):
-                    if queued_task.status_message:
-                        try:
-                            # Позиция в очереди: индекс + 1 (для 1-indexed счета) + 1 (если идет обработка)
-                            position = idx + 1 + (1 if self.is_processing else 0)
-                            
-                            await queued_task.status_message.edit_text(
-                                f"⏳ Ожидание в очереди. Позиция: {position} из {total_tasks}."
-                            )
-                        except Exception as e:
-                            print(f"Ошибка при обновлении статусного сообщения: {e}")
-        
-        self.queue_processor_running = False
+                delivered = await self.handle_audio_generated(
+                    task, result, part=part, total_parts=len(futures), timings=timings
+                )
+                if not delivered:
+                    break
+        finally:
+            # При ошибке отменяем еще не начатые части
+            for future in futures:
+                future.cancel()
 
-    async def handle_audio_generated(self, update: Update, audio_path: str, status_message=None):
-        """Обработчик сгенерированного аудио с обновлением статуса"""
+    async def handle_audio_generated(self, task: AudioTask, result: SynthesisResult,
+                                     part: int = 1, total_parts: int = 1, timings: dict = None) -> bool:
+        """Обработчик сгенерированного аудио с обновлением статуса.
+
+        При потоковой генерации вызывается для каждой части; возвращает True,
+        если часть отправлена и можно продолжать.
+        """
         try:
-            if audio_path:
+            if result.ok:
                 # Обновляем статусное сообщение, если оно есть
-                if status_message:
-                    await status_message.edit_text("✅ Аудио сгенерировано, отправляю...")
+                if total_parts > 1:
+                    self._edit_status(task, f"✅ Часть {part} из {total_parts} сгенерирована, отправляю...")
+                else:
+                    self._edit_status(task, "✅ Аудио сгенерировано, отправляю...")
+                
+                # Отправляем аудио (файл, если он есть, будет удален внутри send_audio)
+                payload_size = result.payload_size
+                upload_start = time.perf_counter()
+                sent_message = await self.send_audio(task, result)
+                upload_time = time.perf_counter() - upload_start
+                if timings is not None:
+                    timings["upload"] = timings.get("upload", 0.0) + upload_time
+                if sent_message is None:
+                    # Пользователь уже уведомлен об ошибке отправки, статус успеха ее не перекрывает
+                    self.tasks_total.inc(result="failed")
+                    return False
+                logger.info("Аудио отправлено", extra={
+                    "task_id": task.task_id, "kind": result.kind, "part": part,
+                    "kb": round(payload_size / 1024, 1), "upload": round(upload_time, 3)
+                })
+                
+                self._mark_startup("first_audio")
                 
-                # Отправляем аудио (файл будет удален внутри send_audio)
-                await self.send_audio(update, audio_path)
+                # Запоминаем file_id, чтобы повторный запрос не требовал синтеза
+                sent_media = sent_message.voice or sent_message.audio
+                if total_parts == 1 and task.cache_key and self.result_cache and sent_media:
+                    self.result_cache.put(task.cache_key, sent_media.file_id, result.kind)
                 
                 # Обновляем итоговый статус
-                if status_message:
-                    await status_message.edit_text("✅ Аудио успешно отправлено!")
+                if part < total_parts:
+                    self._edit_status(
+                        task, f"⏳ Отправлено частей: {part} из {total_parts}, генерирую следующую..."
+                    )
+                else:
+                    self._edit_status(task, "✅ Аудио успешно отправлено!")
+                    self.tasks_total.inc(result="done")
+                return True
             else:
                 # В случае ошибки
-                if status_message:
-                    await status_message.edit_text("🚫 Ошибка генерации файла.")
-                else:
-                    await update.message.reply_text("🚫 Ошибка генерации файла.")
-        except Exception as e:
-            print(f"Ошибка при обработке сгенерированного аудио: {e}")
+                self.tasks_total.inc(result="failed")
+                await self._notify(task, "🚫 Ошибка генерации файла.")
+        except Exception:
+            logger.exception("Ошибка при обработке сгенерированного аудио", extra={"task_id": task.task_id})
+            self.tasks_total.inc(result="failed")
             # Уведомляем пользователя об ошибке
-            if status_message:
-                await status_message.edit_text("🚫 Произошла ошибка при отправке аудио.")
-            else:
-                await update.message.reply_text("🚫 Произошла ошибка при отправке аудио.")
+            await self._notify(task, "🚫 Произошла ошибка при отправке аудио.")
             
             # Дополнительная проверка, что файл удален, если произошла ошибка отправки
+            audio_path = result.audio_path
             if audio_path and os.path.exists(audio_path):
                 try:
                     os.remove(audio_path)
-                    print(f"Файл {audio_path} удален после ошибки отправки")
+                    logger.info("Файл %s удален после ошибки отправки", audio_path, extra={"task_id": task.task_id})
                 except Exception as del_error:
-                    print(f"Не удалось удалить файл {audio_path} после ошибки: {del_error}")
-        finally:
-            # Гарантированно освобождаем флаг занятости
-            self.is_processing = False
+                    logger.warning("Не удалось удалить файл %s после ошибки: %s", audio_path, del_error,
+                                   extra={"task_id": task.task_id})
+        return False
+
+    async def send_audio(self, task: AudioTask, result: SynthesisResult):
+        """Асинхронная отправка аудио с повторными попытками.
 
-    async def send_audio(self, update: Update, audio_path: str):
-        """Асинхронная отправка аудиофайла с повторными попытками"""
+        Возвращает отправленное сообщение или None, если отправить не удалось;
+        в этом случае пользователь уже уведомлен.
+        """
+        # Голосовое сообщение отправляется прямо из памяти
+        if result.audio_data:
+            for attempt in range(3):  # Простая попытка повтора до 3 раз
+                try:
+                    return await self.bot.send_voice(
+                        task.chat_id, voice=result.audio_data, reply_parameters=self._reply_parameters(task)
+                    )
+                except Exception as e:
+                    self.telegram_errors.inc(method="sendVoice")
+                    logger.warning("Ошибка sendVoice: %s", e, extra={"task_id": task.task_id, "attempt": attempt + 1})
+                    if attempt == 2:  # Последняя попытка
+                        await self._notify(task, "🚫 Не удалось отправить аудиофайл.")
+                    else:
+                        self.telegram_retries.inc(method="sendVoice")
+                        await asyncio.sleep(2)  # Пауза перед следующей попыткой
+            return None
+        
+        audio_path = result.audio_path
         for attempt in range(3):  # Простая попытка повтора до 3 раз
             try:
                 if not os.path.exists(audio_path):
-                    await update.message.reply_text("🚫 Файл для отправки не найден.")
-                    return
+                    await self._notify(task, "🚫 Файл для отправки не найден.")
+                    return None
                 
                 with open(audio_path, 'rb') as audio_file:
-                    await update.message.reply_audio(audio=audio_file)
-                return  # Успешно отправили - выходим
+                    return await self.bot.send_audio(  # Успешно отправили - выходим
+                        task.chat_id, audio=audio_file, reply_parameters=self._reply_parameters(task)
+                    )
             except Exception as e:
+                self.telegram_errors.inc(method="sendAudio")
+                logger.warning("Ошибка sendAudio: %s", e, extra={"task_id": task.task_id, "attempt": attempt + 1})
                 if attempt == 2:  # Последняя попытка
-                    await update.message.reply_text("🚫 Не удалось отправить аудиофайл.")
+                    await self._notify(task, "🚫 Не удалось отправить аудиофайл.")
                 else:
+                    self.telegram_retries.inc(method="sendAudio")
                     await asyncio.sleep(2)  # Пауза перед следующей попыткой
             finally:
                 if os.path.exists(audio_path):
                     os.remove(audio_path)
+        return None
 
     def get_memory_usage(self):
-        """Получает информацию о памяти с кэшированием (обновление раз в 10 секунд)"""
-        if not HAS_PSUTIL:
+        """RSS основного процесса и воркеров синтеза в МБ или None без psutil"""
+        if self.process_collector.process is None:
             return None
-            
-        now = datetime.now()
-        
-        # Если кэш устарел или отсутствует
-        if (self.memory_usage_cache["timestamp"] is None or
-                (now - self.memory_usage_cache["timestamp"]).total_seconds() > 10):
-            try:
-                process = psutil.Process(os.getpid())
-                memory = process.memory_info().rss / 1024 / 1024  # в МБ
-                self.memory_usage_cache = {
-                    "value": memory,
-                    "timestamp": now
-                }
-            except Exception as e:
-                print(f"Ошибка при получении информации о памяти: {e}")
-                return None
-                
-        return self.memory_usage_cache["value"]
+        return self.process_collector.memory_mb()
 
     async def status_command(self, update: Update, context: CallbackContext):
         """Обработчик команды /status с информацией о состоянии очереди"""
         # Получаем размер очереди и вычисляем общее количество занятых слотов
-        queue_size = self.tasks_queue.qsize()
-        total_slots_used = queue_size + (1 if self.is_processing else 0)
+        queue_size = self.task_store.count_pending()
+        total_slots_used = queue_size + self._busy_slots()
         remaining_slots = config.max_queue_size - total_slots_used
         
         # Базовая информация о состоянии системы
         status_lines = [
             "📊 Статус системы:\n",
-            f"{'🟢 Свободен' if not self.is_processing else '🟡 В процессе генерации'}"
+            f"{'🟢 Свободен' if not self._busy_slots() else '🟡 В процессе генерации'}"
         ]
+        if not self.is_ready:
+            status_lines.append(self._loading_text())
+        
+        # Состояние каждого воркера синтеза этого узла и всех узлов общей очереди
+        if self.pool.workers:
+            status_lines.extend(self._get_workers_status_lines())
+        status_lines.extend(self._get_nodes_status_lines())
         
         # Информация о занятых слотах очереди
         status_lines.append(f"📋 Слоты очереди: {total_slots_used} из {config.max_queue_size} (свободно: {remaining_slots})")
         
         # Получаем список заданий из очереди для отображения
-        queue_items = list(self.tasks_queue.queue)
-        
-        # Если есть текущее задание в обработке, показываем его отдельно
-        if self.is_processing and self.current_task:
-            status_lines.append(f"🔄 Сейчас генерируется: запрос от {self.current_task.update.effective_user.first_name} "
-                               f"(добавлен {self.current_task.created_at.strftime('%H:%M:%S')})")
+        queue_items = self.task_store.ordered_pending()
         
         # Отображаем все задания в очереди
         if queue_items:
             status_lines.append(f"📋 Задания в очереди ({len(queue_items)}):")
             for i, task in enumerate(queue_items, start=1):
                 status_lines.append(
-                    f"   {i}. ⏳ В очереди: запрос от {task.update.effective_user.first_name} "
+                    f"   {i}. ⏳ В очереди: запрос от {task.user_name} "
                     f"(добавлен {task.created_at.strftime('%H:%M:%S')})"
                 )
         else:
             status_lines.append("📋 Нет ожидающих заданий в очереди")
         
+        # Статистика фонового обновления статусных сообщений
+        status_lines.append(f"✏️ Правки статусов: {self.status_updater.summary()}")
+        
+        # Модель времени задания и оценка загрузки очереди
+        eta_model = self._eta_model()
+        status_lines.append(
+            f"⌛ Оценка задания: {eta_model.intercept:.1f} с + {eta_model.slope:.3f} с на символ "
+            f"(замеров: {eta_model.samples}), очередь освободится через {format_eta(self._backlog_seconds())}"
+        )
+        
+        # Голоса и кэш их латентов в памяти воркеров
+        voices_line = f"🎙 Голоса: {len(self.voices)}"
+        if self.pool.workers:
+            latents = self._latents_stats()
+            lookups = latents["hit"] + latents["miss"]
+            cached = sum(len(worker.latents.get("voices", ())) for worker in self.pool.workers)
+            voices_line += f", латенты в памяти воркеров: {cached}"
+            if lookups:
+                voices_line += f", попаданий: {latents['hit'] / lookups:.0%}"
+        status_lines.append(voices_line)
+        
+        # Статистика кэша готовых результатов
+        if self.result_cache:
+            status_lines.append(
+                f"🗄 Кэш результатов: {self.result_cache.size()} записей, "
+                f"попаданий: {self.result_cache.hits}, промахов: {self.result_cache.misses}"
+            )
+        
+        # Длительность этапов обработки заданий
+        timing_lines = self.stage_timings.summary_lines()
+        if timing_lines:
+            status_lines.append("⏱ Этапы обработки:")
+            status_lines.extend(f"   {line}" for line in timing_lines)
+        
+        # Время запуска бота
+        if self.startup_timings:
+            status_lines.append("🚀 Запуск: " + format_timings(self.startup_timings))
+        
         # Добавляем информацию о памяти
         memory_usage = self.get_memory_usage()
         if memory_usage is not None:
-            status_lines.append(f"💾 Использование памяти: {memory_usage:.1f} МБ")
+            status_lines.append(
+                f"💾 Использование памяти: бот {memory_usage['main']:.1f} МБ, "
+                f"воркеры {memory_usage['worker']:.1f} МБ"
+            )
+        if config.worker_memory_limit_mb:
+            status_lines.append(
+                f"🧠 Потолок воркера {config.worker_memory_limit_mb:.0f} МБ, "
+                f"~{self.memory_governor.overhead_mb:.0f} МБ + {self.memory_governor.mb_per_char:.1f} МБ на символ, "
+                f"сегмент до {self._segment_chars()} символов, "
+                f"перезапусков: {self.memory_governor.recycles}"
+            )
         
         # Формируем итоговое сообщение
         status_message = "\n".join(status_lines)
         await update.message.reply_text(status_message)
 
+    async def profile_command(self, update: Update, context: CallbackContext):
+        """Команда администратора /profile N [torch]: профилирование следующих N заданий.
+
+        Воркеры пишут сэмплы CPU, аллокации и разбивку по этапам в profile_dir;
+        без включенного профилирования синтез идет без каких-либо замеров.
+        """
+        if update.effective_user.id not in config.admin_user_ids:
+            await update.message.reply_text("⛔ Команда доступна только администраторам.")
+            return
+        
+        args = [arg.lower() for arg in context.args or []]
+        if args and args[0] == "off":
+            self.profile_request = None
+            await update.message.reply_text("🔬 Профилирование выключено.")
+            return
+        try:
+            count = int(args[0]) if args else 1
+        except ValueError:
+            count = 0
+        if count <= 0:
+            await update.message.reply_text("Использование: /profile N [torch] или /profile off")
+            return
+        if config.role != "all":
+            # Узлы-воркеры не получают обновлений Telegram, а у фронтенда нет воркеров синтеза
+            await update.message.reply_text("🔬 Профилирование доступно только на узле с role = all.")
+            return
+        
+        mode = "torch" if "torch" in args[1:] else "cpu"
+        self.profile_request = {"remaining": count, "mode": mode, "chat_id": update.effective_chat.id}
+        logger.info("Профилирование включено", extra={"user_id": update.effective_user.id, "tasks": count, "mode": mode})
+        await update.message.reply_text(
+            f"🔬 Профилирование ({mode}) включено для следующих {count} заданий. "
+            f"Результаты будут в каталоге {config.profile_dir} на узле {self.node_id}."
+        )
+
     async def start_command(self, update: Update, context: CallbackContext):
         """Обработчик команды /start с информацией о боте и очереди"""
         queue_info = self._get_queue_status_text()
@@ -391,33 +1278,35 @@ class BotManager:
             "🎙 Я бот для генерации аудио с голосом Путина.\n\n"
             "Как использовать:\n"
             "- Отправь команду /gen с текстом для синтеза\n"
+            "- Другой голос: /gen voice=<имя> текст\n"
             "- Используй /status для проверки состояния системы\n\n"
             "Ограничения:\n"
             f"- Минимальная длина текста: {config.min_text_length} символа\n"
             f"- Максимальная длина текста: {config.max_text_length} символов\n"
-            f"- Максимальное количество заданий в очереди: {config.max_queue_size}\n\n"
+            f"- Максимальное количество заданий в очереди: {config.max_queue_size}\n"
+            f"- Максимум заданий от одного пользователя: {config.max_tasks_per_user}\n\n"
+            f"Голоса: {', '.join(self.voices.names())}\n\n"
             "Текущий статус очереди:\n"
             f"{queue_info}"
         )
+        if not self.is_ready:
+            welcome_text += f"\n\n{self._loading_text()}"
         
         await update.message.reply_text(welcome_text)
 
     async def error_handler(self, update: Update, context: CallbackContext):
         """Улучшенный обработчик ошибок с обязательным снятием флага занятости"""
-        print(f"Ошибка при обработке обновления: {context.error}")
+        logger.error("Ошибка при обработке обновления: %s", context.error, exc_info=context.error)
         
         error_message = "🚨 Произошла ошибка."
         if update and update.message:
             await update.message.reply_text(f"{error_message} Попробуйте снова позже.")
         
-        # Обязательно сбрасываем флаг занятости при любой ошибке
-        self.is_processing = False
-        
         # Также нужно разблокировать обработку очереди, если произошла ошибка
         # в процессе обработки очереди
-        if not self.tasks_queue.empty() and not self.queue_processor_running:
+        if self.task_store.count_pending() and not self.queue_processor_running:
             # Перезапускаем обработчик очереди
-            asyncio.create_task(self.process_queue())
+            self._kick_queue()
 
     def cleanup_old_files(self):
         """Оптимизированная очистка старых файлов"""
@@ -432,17 +1321,67 @@ class BotManager:
                     if os.path.isfile(file_path):
                         try:
                             os.remove(file_path)
-                            print(f"Удален старый временный файл: {file_path}")
+                            logger.info("Удален старый временный файл: %s", file_path)
                         except Exception as e:
-                            print(f"Не удалось удалить файл {file_path}: {e}")
+                            logger.warning("Не удалось удалить файл %s: %s", file_path, e)
         except Exception as e:
-            print(f"Ошибка при очистке временных файлов: {e}")
+            logger.warning("Ошибка при очистке временных файлов: %s", e)
+
+    def _loading_text(self) -> str:
+        elapsed = time.perf_counter() - PROCESS_START
+        return (f"⏳ Модель загружается ({elapsed:.0f} с после запуска). "
+                f"Задания /gen принимаются и будут выполнены после загрузки.")
+
+    def _get_workers_status_lines(self) -> list:
+        """Формирует строки с состоянием каждого воркера синтеза"""
+        state_labels = {
+            "loading": "⏳ загрузка модели",
+            "idle": "🟢 свободен",
+            "busy": "🟡 генерирует",
+            "recycling": "♻️ перезапуск (потолок памяти)",
+            "error": "🔴 ошибка",
+        }
+        
+        lines = [f"👷 Воркеры синтеза ({len(self.pool.workers)}):"]
+        for worker in self.pool.workers:
+            line = (
+                f"   {worker.worker_id}. {state_labels.get(worker.state, worker.state)}, "
+                f"потоков: {worker.num_threads}, выполнено: {worker.tasks_done}"
+            )
+            if worker.recycles:
+                line += f", перезапусков: {worker.recycles}"
+            if worker.state == "busy" and worker.current_tasks:
+                first = worker.current_tasks[0]
+                line += f" — запрос от {first.user_name} (добавлен {first.created_at.strftime('%H:%M:%S')})"
+                if len(worker.current_tasks) > 1:
+                    line += f" и еще {len(worker.current_tasks) - 1} в пакете"
+            elif worker.state == "busy" and worker.helping:
+                line += f" — сегменты длинного запроса от {worker.helping.user_name}"
+            lines.append(line)
+        return lines
+
+    def _get_nodes_status_lines(self) -> list:
+        """Состояние узлов общей очереди по их heartbeat; один узел с role = all не показываем"""
+        nodes = self.task_store.nodes()
+        if config.role == "all" and len(nodes) <= 1:
+            return []
+        
+        alive = sum(1 for _, age, _ in nodes if self._node_alive(age))
+        lines = [f"🖥 Узлы ({alive} из {len(nodes)} на связи):"]
+        for node_id, age, info in nodes:
+            workers = ", ".join(f"{state} {count}" for state, count in info.get("workers", {}).items() if count)
+            lines.append(
+                f"   {'🟢' if self._node_alive(age) else '🔴'} {node_id} ({info.get('role')}): "
+                f"heartbeat {age:.0f} с назад, воркеры: {workers or 'нет'}, "
+                f"выполнено: {info.get('tasks_done', 0)}"
+            )
+        return lines
 
     def _get_queue_status_text(self) -> str:
         """Формирует текст с информацией о состоянии очереди"""
         # Получаем размер очереди и вычисляем общее количество занятых слотов
-        queue_size = self.tasks_queue.qsize()
-        total_slots_used = queue_size + (1 if self.is_processing else 0)
+        queue_size = self.task_store.count_pending()
+        total_slots_used = queue_size + self._busy_slots()
         remaining_slots = config.max_queue_size - total_slots_used
         
         if total_slots_used == 0:
@@ -451,22 +1390,22 @@ class BotManager:
         # Формируем основную информацию о состоянии очереди
         queue_info = f"📋 Слоты очереди: {total_slots_used} из {config.max_queue_size} (свободно: {remaining_slots})"
         
-        # Информация о текущем задании в обработке
+        # Информация о заданиях, которые сейчас генерируются воркерами
         current_task_info = ""
-        if self.is_processing and self.current_task:
-            current_task_info = (
-                f"🔄 Сейчас генерируется: запрос от {self.current_task.update.effective_user.first_name} "
-                f"(добавлен {self.current_task.created_at.strftime('%H:%M:%S')})\n"
+        for task in self.task_store.running_tasks():
+            current_task_info += (
+                f"🔄 Сейчас генерируется: запрос от {task.user_name} "
+                f"(добавлен {task.created_at.strftime('%H:%M:%S')})\n"
             )
         
         # Получаем список заданий из очереди для отображения
-        queue_items = list(self.tasks_queue.queue)
+        queue_items = self.task_store.ordered_pending()
         
         # Формируем список всех заданий в очереди
         tasks_info = []
         for i, task in enumerate(queue_items, start=1):
             tasks_info.append(
-                f"   {i}. ⏳ В очереди: запрос от {task.update.effective_user.first_name} "
+                f"   {i}. ⏳ В очереди: запрос от {task.user_name} "
                 f"(добавлен {task.created_at.strftime('%H:%M:%S')})"
             )
         
@@ -477,31 +1416,51 @@ class BotManager:
         return f"{queue_info}\n{current_task_info}{tasks_header}{tasks_info_str}"
 
 def main():
+    setup_logging(config.log_format, config.log_level)
+    
     # Создаем и конфигурируем менеджер бота
     bot_manager = BotManager()
-    
-    # Загружаем TTS модель при запуске для моментальной готовности
-    bot_manager.initialize_tts()
 
-    # Инициализируем приложение Telegram
-    application = Application.builder().token(config.token).build()
+    # Инициализируем приложение Telegram; модели загружаются в фоне уже после старта
+    builder = (
+        Application.builder()
+        .token(config.token)
+        .post_init(lambda app: bot_manager.startup(app.bot))
+    )
+    # Для локальных нагрузочных тестов запросы к Bot API можно направить на заглушку
+    if config.telegram_api_base_url:
+        builder = builder.base_url(config.telegram_api_base_url).base_file_url(config.telegram_api_base_url)
+    application = builder.build()
 
-    # Регистрация обработчиков
+    # Регистрация обработчиков; первая группа только замеряет время до первого обновления
+    application.add_handler(TypeHandler(Update, bot_manager.on_any_update), group=-1)
     application.add_handler(CommandHandler("start", bot_manager.start_command))
     application.add_handler(CommandHandler("gen", bot_manager.gen_command))
     application.add_handler(CommandHandler("status", bot_manager.status_command))
+    application.add_handler(CommandHandler("profile", bot_manager.profile_command))
     
     # Регистрация обработчика ошибок
     application.add_error_handler(bot_manager.error_handler)
     
     # Запуск асинхронного бота
-    print("Бот запущен и готов к работе...")
+    logger.info("Бот запущен и готов к работе", extra={"mode": config.mode})
     
     # Запускаем очистку файлов сразу при первой генерации
     bot_manager.cleanup_old_files()
     
-    # Запускаем приложение 
-    application.run_polling()
+    # Запускаем приложение в выбранном режиме
+    try:
+        if config.role == "worker":
+            # Узел-воркер не принимает обновления: берет задания из общей очереди и сам отправляет результаты
+            from worker_node import run_worker_node
+            asyncio.run(run_worker_node(bot_manager, config))
+        elif config.mode == "webhook":
+            from webhook_server import run_webhook
+            asyncio.run(run_webhook(application, bot_manager, config))
+        else:
+            application.run_polling()
+    finally:
+        bot_manager.pool.shutdown()
 
 if __name__ == "__main__":
     main()
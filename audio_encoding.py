@@ -0,0 +1,67 @@
+import subprocess
+import wave
+
+import numpy as np
+
+
+def to_float32(wav) -> np.ndarray:
+    """Приводит результат синтеза (список, тензор или массив) к моно float32"""
+    if hasattr(wav, "detach"):
+        wav = wav.detach().cpu().numpy()
+    return np.asarray(wav, dtype=np.float32).reshape(-1)
+
+
+def crossfade_concat(wavs: list, sample_rate: int, crossfade_ms: float) -> np.ndarray:
+    """Склеивает фрагменты волны, сглаживая стыки линейным кроссфейдом"""
+    overlap = int(sample_rate * crossfade_ms / 1000)
+    pieces = []
+    tail = np.zeros(0, dtype=np.float32)
+    for wav in wavs:
+        wav = to_float32(wav)
+        n = min(overlap, len(tail), len(wav))
+        if n:
+            fade = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            pieces.append(tail[:-n])
+            pieces.append(tail[-n:] * (1.0 - fade) + wav[:n] * fade)
+            wav = wav[n:]
+        else:
+            pieces.append(tail)
+        tail = wav
+    pieces.append(tail)
+    return np.concatenate(pieces)
+
+
+def encode_ogg_opus(wav, sample_rate: int, bitrate: str = "32k") -> bytes:
+    """Кодирует волну в OGG/Opus в памяти через pipe к ffmpeg.
+
+    Результат подходит для sendVoice: Telegram показывает его как голосовое сообщение.
+    """
+    samples = to_float32(wav)
+    process = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "f32le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+            "-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+            "-f", "ogg", "pipe:1",
+        ],
+        input=samples.tobytes(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg завершился с кодом {process.returncode}: "
+                           f"{process.stderr.decode('utf-8', 'replace').strip()}")
+    return process.stdout
+
+
+def write_wav(path: str, wav, sample_rate: int):
+    """Записывает 16-битный моно WAV с нормализацией громкости, как TTS save_wav"""
+    samples = to_float32(wav)
+    peak = float(np.max(np.abs(samples))) if samples.size else 0.0
+    samples = samples * (32767 / max(0.01, peak))
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.astype(np.int16).tobytes())
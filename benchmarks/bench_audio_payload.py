@@ -0,0 +1,97 @@
+"""Сравнение размера и времени отправки результата: WAV-файл против OGG/Opus из памяти.
+
+Синтезирует несколько фраз, кодирует их обоими способами и печатает размер
+и время кодирования. Если указан --chat-id, дополнительно замеряет загрузку
+в Telegram через sendAudio и sendVoice (используется token из config.json).
+
+Запуск из корня проекта:
+    python benchmarks/bench_audio_payload.py [--chat-id 123456]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_encoding import encode_ogg_opus  # noqa: E402
+from config import load_config  # noqa: E402
+from tts_engine import TTSEngine  # noqa: E402
+
+TEXTS = [
+    "Добрый вечер.",
+    "Сегодня мы поговорим о погоде и о том, что ждет нас в ближайшие выходные.",
+    "Коллеги, я внимательно выслушал все предложения. Давайте двигаться дальше, "
+    "без лишней спешки, но и без промедления, потому что время не ждет.",
+]
+
+
+async def upload(token, chat_id, wav_path, ogg_data):
+    from telegram import Bot
+
+    async with Bot(token) as bot:
+        start = time.perf_counter()
+        with open(wav_path, 'rb') as f:
+            await bot.send_audio(chat_id=chat_id, audio=f)
+        wav_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await bot.send_voice(chat_id=chat_id, voice=ogg_data)
+        ogg_time = time.perf_counter() - start
+    return wav_time, ogg_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--chat-id", type=int, default=None)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    engine = TTSEngine(config)
+    engine.load()
+    synthesizer = engine.tts.synthesizer
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for idx, text in enumerate(TEXTS):
+            wav, _ = engine._synthesize(text)
+
+            wav_path = os.path.join(tmp_dir, f"{idx}.wav")
+            start = time.perf_counter()
+            synthesizer.save_wav(wav=wav, path=wav_path)
+            wav_encode = time.perf_counter() - start
+
+            start = time.perf_counter()
+            ogg_data = encode_ogg_opus(wav, synthesizer.output_sample_rate, config.opus_bitrate)
+            ogg_encode = time.perf_counter() - start
+
+            row = {
+                "chars": len(text),
+                "wav_kb": os.path.getsize(wav_path) / 1024,
+                "ogg_kb": len(ogg_data) / 1024,
+                "wav_encode": wav_encode,
+                "ogg_encode": ogg_encode,
+            }
+            if args.chat_id:
+                row["wav_upload"], row["ogg_upload"] = asyncio.run(
+                    upload(config.token, args.chat_id, wav_path, ogg_data)
+                )
+            rows.append(row)
+
+    for row in rows:
+        line = (f"{row['chars']:4d} симв.: WAV {row['wav_kb']:8.1f} КБ ({row['wav_encode'] * 1000:6.1f} мс), "
+                f"OGG/Opus {row['ogg_kb']:6.1f} КБ ({row['ogg_encode'] * 1000:6.1f} мс)")
+        if "wav_upload" in row:
+            line += f", загрузка WAV {row['wav_upload']:.2f} с / OGG {row['ogg_upload']:.2f} с"
+        print(line)
+
+    ratio = statistics.mean(row["wav_kb"] / row["ogg_kb"] for row in rows)
+    print(f"OGG/Opus в среднем меньше WAV в {ratio:.1f} раз")
+
+
+if __name__ == "__main__":
+    main()
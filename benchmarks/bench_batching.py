@@ -0,0 +1,88 @@
+"""Компромисс пропускной способности и задержки при пакетном синтезе.
+
+Запускает loadtest.py с одинаковой нагрузкой для нескольких значений
+max_batch_size (и окна ожидания пакета) и сводит в таблицу пропускную
+способность, средний размер пакета и p50/p95 полного времени обработки.
+
+Пример:
+    python benchmarks/bench_batching.py --backend fake --batch-sizes 1,2,4,8 \\
+        --tasks 60 --rate 4 --lengths uniform:20-120 --output bench_results/batching.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_loadtest(args, batch_size: int, window_ms: int, out_path: str) -> dict:
+    command = [
+        sys.executable, os.path.join(HERE, "loadtest.py"),
+        "--config", args.config,
+        "--backend", args.backend,
+        "--workers", str(args.workers),
+        "--tasks", str(args.tasks),
+        "--users", str(args.users),
+        "--rate", str(args.rate),
+        "--lengths", args.lengths,
+        "--seed", str(args.seed),
+        "--max-batch-size", str(batch_size),
+        "--batch-window-ms", str(window_ms),
+        "--output", out_path,
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    with open(out_path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--backend", choices=("fake", "xtts"), default="fake")
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--windows-ms", default="50", help="окна ожидания пакета через запятую")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=4.0)
+    parser.add_argument("--lengths", default="uniform:20-120")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for window_ms in (int(x) for x in args.windows_ms.split(",")):
+            for batch_size in (int(x) for x in args.batch_sizes.split(",")):
+                print(f"max_batch_size={batch_size}, окно {window_ms} мс...")
+                out_path = os.path.join(tmp_dir, f"{batch_size}_{window_ms}.json")
+                results = run_loadtest(args, batch_size, window_ms, out_path)
+                rows.append({
+                    "max_batch_size": batch_size,
+                    "batch_window_ms": window_ms,
+                    "throughput_tasks_per_second": results["throughput_tasks_per_second"],
+                    "avg_batch_size": results["batch_size"].get("avg"),
+                    "queue_wait_p50": results["queue_wait"].get("p50"),
+                    "total_p50": results["total"].get("p50"),
+                    "total_p95": results["total"].get("p95"),
+                    "peak_rss_mb": results["peak_rss_mb"],
+                })
+
+    print(f"{'пакет':>6}{'окно, мс':>10}{'задач/с':>10}{'ср. пакет':>11}"
+          f"{'ожидание p50':>14}{'всего p50':>11}{'всего p95':>11}")
+    for row in rows:
+        print(f"{row['max_batch_size']:>6}{row['batch_window_ms']:>10}"
+              f"{row['throughput_tasks_per_second']:>10.2f}{row['avg_batch_size'] or 0:>11.2f}"
+              f"{row['queue_wait_p50'] or 0:>14.2f}{row['total_p50'] or 0:>11.2f}{row['total_p95'] or 0:>11.2f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": rows}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
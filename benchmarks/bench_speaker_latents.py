@@ -0,0 +1,79 @@
+"""Сравнение задержки генерации с кэшем латентов диктора и без него.
+
+Запуск из корня проекта:
+    python benchmarks/bench_speaker_latents.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TTS.api import TTS  # noqa: E402
+from TTS import __version__ as TTS_VERSION  # noqa: E402
+
+from config import load_config  # noqa: E402
+from speaker_latents import SpeakerLatentsCache  # noqa: E402
+
+MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+TEXT = "Добрый вечер, дорогие друзья. Сегодня мы поговорим о погоде."
+
+
+def measure(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name}: среднее {statistics.mean(timings):.2f} с, "
+          f"медиана {statistics.median(timings):.2f} с, мин {min(timings):.2f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--config", default="config.json")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    tts = TTS(model_name=MODEL_NAME, progress_bar=False, gpu=False)
+    model = tts.synthesizer.tts_model
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        latents_cache = SpeakerLatentsCache(cache_dir, f"{MODEL_NAME}@{TTS_VERSION}")
+
+        start = time.perf_counter()
+        latents_cache.load_or_compute(model, config.path_default_sempl_voice)
+        print(f"Холодный расчет латентов: {time.perf_counter() - start:.2f} с")
+
+        start = time.perf_counter()
+        gpt_cond_latent, speaker_embedding = latents_cache.load_or_compute(model, config.path_default_sempl_voice)
+        print(f"Загрузка латентов из кэша: {time.perf_counter() - start:.3f} с")
+
+        out_path = os.path.join(cache_dir, "out.wav")
+
+        def without_cache():
+            tts.tts_to_file(text=TEXT, file_path=out_path,
+                            speaker_wav=config.path_default_sempl_voice, language="ru")
+
+        def with_cache():
+            out = model.inference(text=TEXT, language="ru", gpt_cond_latent=gpt_cond_latent,
+                                  speaker_embedding=speaker_embedding, enable_text_splitting=True)
+            tts.synthesizer.save_wav(wav=out["wav"], path=out_path)
+
+        # Прогрев, чтобы не учитывать первичную инициализацию
+        with_cache()
+
+        report("Без кэша (speaker_wav на каждый запрос)", measure(without_cache, args.runs))
+        report("С кэшем латентов", measure(with_cache, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Сравнение качества и скорости режимов инференса XTTS на CPU.
+
+Для каждого режима (fp32, int8, ONNX-декодер HiFi-GAN и их сочетание)
+синтезирует одни и те же фразы с фиксированным seed и печатает real-time
+factor и сходство с результатом fp32. Сходство — косинус между эмбеддингами
+диктора, которые извлекает из обоих аудио эталонная fp32-модель.
+
+Запуск из корня проекта:
+    python benchmarks/compare_inference.py --threads 8 --output bench_results/inference.json
+"""
+import argparse
+import dataclasses
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch  # noqa: E402
+
+from audio_encoding import write_wav  # noqa: E402
+from config import load_config  # noqa: E402
+from tts_engine import TTSEngine  # noqa: E402
+
+TEXTS = [
+    "Добрый вечер, дорогие друзья.",
+    "Сегодня мы поговорим о погоде и о том, что ждет нас в ближайшие выходные.",
+    "Коллеги, давайте двигаться дальше, без лишней спешки, но и без промедления.",
+]
+
+MODES = {
+    "fp32": {"inference_precision": "fp32", "hifigan_backend": "torch"},
+    "int8": {"inference_precision": "int8", "hifigan_backend": "torch"},
+    "fp32+onnx": {"inference_precision": "fp32", "hifigan_backend": "onnx"},
+    "int8+onnx": {"inference_precision": "int8", "hifigan_backend": "onnx"},
+}
+
+
+def run_mode(config, overrides: dict, out_dir: str, seed: int, runs: int) -> dict:
+    engine = TTSEngine(dataclasses.replace(config, **overrides))
+    engine.load()
+
+    # Прогрев: первые вызовы включают инициализацию аллокатора и ядер
+    engine._synthesize(TEXTS[0])
+
+    rtfs, paths = [], []
+    for idx, text in enumerate(TEXTS):
+        for _ in range(runs):
+            torch.manual_seed(seed)
+            start = time.perf_counter()
+            wav, sample_rate = engine._synthesize(text)
+            elapsed = time.perf_counter() - start
+            rtfs.append(elapsed / (len(wav) / sample_rate))
+
+        path = os.path.join(out_dir, f"{idx}.wav")
+        write_wav(path, wav, sample_rate)
+        paths.append(path)
+
+    del engine
+    return {"rtf": statistics.mean(rtfs), "rtf_min": min(rtfs), "paths": paths}
+
+
+def speaker_similarity(reference_model, path_a: str, path_b: str) -> float:
+    _, emb_a = reference_model.get_conditioning_latents(audio_path=[path_a])
+    _, emb_b = reference_model.get_conditioning_latents(audio_path=[path_b])
+    return torch.nn.functional.cosine_similarity(emb_a.flatten(), emb_b.flatten(), dim=0).item()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--modes", default=",".join(MODES), help="через запятую: " + ", ".join(MODES))
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--interop-threads", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.set_num_interop_threads(args.interop_threads)
+    config = load_config(args.config)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in args.modes.split(","):
+            mode_dir = os.path.join(tmp_dir, mode)
+            os.makedirs(mode_dir)
+            print(f"Режим {mode}...")
+            results[mode] = run_mode(config, MODES[mode], mode_dir, args.seed, args.runs)
+
+        # Эталонная модель для эмбеддингов — всегда fp32
+        reference = TTSEngine(dataclasses.replace(config, **MODES["fp32"]))
+        reference.load()
+        reference_model = reference.tts.synthesizer.tts_model
+        baseline = results.get("fp32")
+
+        for mode, result in results.items():
+            if baseline:
+                result["similarity_to_fp32"] = statistics.mean(
+                    speaker_similarity(reference_model, a, b) for a, b in zip(baseline["paths"], result["paths"])
+                )
+            result["similarity_to_sample"] = statistics.mean(
+                speaker_similarity(reference_model, config.path_default_sempl_voice, path)
+                for path in result["paths"]
+            )
+            del result["paths"]
+
+    print(f"{'режим':<12}{'RTF':>8}{'RTF мин':>10}{'сходство с fp32':>18}{'с образцом':>12}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['rtf']:>8.3f}{result['rtf_min']:>10.3f}"
+              f"{result.get('similarity_to_fp32', float('nan')):>18.4f}{result['similarity_to_sample']:>12.4f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
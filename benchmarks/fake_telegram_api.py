@@ -0,0 +1,195 @@
+"""Заглушка Telegram Bot API для локальных сквозных нагрузочных тестов без сети.
+
+Отвечает на методы, которые вызывает бот (getMe, setWebhook, sendMessage,
+editMessageText, sendVoice, sendAudio и т.д.), и после setWebhook проигрывает
+записанные обновления в webhook бота с секретным токеном. Для каждого
+запроса /gen замеряет время от доставки обновления до получения голосового
+ответа. Если запустить бота сразу после заглушки, отчет также покажет время
+холодного старта: до первого запроса бота, до первого ответа на обновление
+и до первого аудио.
+
+Пример:
+    # config.json бота: "mode": "webhook", "webhook_url": "http://127.0.0.1:8443",
+    #                   "telegram_api_base_url": "http://127.0.0.1:8081/bot"
+    python benchmarks/fake_telegram_api.py --updates benchmarks/sample_updates.jsonl --rate 2
+    python aittsbot.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+
+from aiohttp import ClientSession, web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "BotParodist", "username": "fake_parodist_bot"}
+
+
+class FakeBotApi:
+    def __init__(self, updates, rate: float, repeat: int, expected_replies: int):
+        self.updates = updates
+        self.rate = rate
+        self.repeat = repeat
+        self.expected_replies = expected_replies
+        self.message_ids = itertools.count(100000)
+        self.update_ids = itertools.count(1)
+        self.calls = {}
+        self.payload_bytes = 0
+        self.sent_at = {}
+        self.latencies = []
+        self.webhook = None
+        self.replay_task = None
+        self.done = asyncio.Event()
+        self.started_at = time.perf_counter()
+        self.startup = {}
+
+    def _message(self, chat_id, text=None, **extra):
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": BOT_USER,
+        }
+        if text is not None:
+            message["text"] = text
+        message.update(extra)
+        return message
+
+    def _mark_startup(self, event: str):
+        self.startup.setdefault(event, time.perf_counter() - self.started_at)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self._mark_startup("first_api_call")
+
+        if request.content_type == "multipart/form-data":
+            params = dict(await request.post())
+        elif request.can_read_body:
+            params = await request.json() if request.content_type == "application/json" else dict(await request.post())
+        else:
+            params = dict(request.query)
+
+        handler = getattr(self, f"api_{method}", None)
+        result = handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    def api_getMe(self, params):
+        return BOT_USER
+
+    def api_setWebhook(self, params):
+        self.webhook = (params["url"], params.get("secret_token"))
+        if self.replay_task is None:
+            self.replay_task = asyncio.create_task(self.replay())
+        return True
+
+    def api_deleteWebhook(self, params):
+        return True
+
+    def api_sendMessage(self, params):
+        self._mark_startup("first_reply")
+        return self._message(params["chat_id"], params.get("text"))
+
+    def api_editMessageText(self, params):
+        return self._message(params["chat_id"], params.get("text"))
+
+    def _media_reply(self, params, field):
+        self._mark_startup("first_audio")
+        media = params.get(field)
+        size = len(media.file.read()) if hasattr(media, "file") else 0
+        self.payload_bytes += size
+
+        reply_to = params.get("reply_parameters")
+        if reply_to:
+            reply_to = json.loads(reply_to) if isinstance(reply_to, str) else reply_to
+            key = (int(params["chat_id"]), int(reply_to["message_id"]))
+            if key in self.sent_at:
+                self.latencies.append(time.perf_counter() - self.sent_at.pop(key))
+                if self.expected_replies and len(self.latencies) >= self.expected_replies:
+                    self.done.set()
+
+        file_info = {"file_id": f"fake-{next(self.message_ids)}", "file_unique_id": "fake", "duration": 1}
+        return self._message(params["chat_id"], **{field: file_info})
+
+    def api_sendVoice(self, params):
+        return self._media_reply(params, "voice")
+
+    def api_sendAudio(self, params):
+        return self._media_reply(params, "audio")
+
+    async def replay(self):
+        """Проигрывает записанные обновления в webhook бота с заданной частотой"""
+        url, secret = self.webhook
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+
+        async with ClientSession() as session:
+            for _ in range(self.repeat):
+                for update in self.updates:
+                    update = json.loads(json.dumps(update))
+                    update["update_id"] = next(self.update_ids)
+                    message = update.get("message")
+                    if message:
+                        # Уникальные id, чтобы повторы не склеивались при подсчете задержки
+                        message["message_id"] = next(self.message_ids)
+                        message["date"] = int(time.time())
+                        if message.get("text", "").startswith("/gen"):
+                            self.sent_at[(message["chat"]["id"], message["message_id"])] = time.perf_counter()
+
+                    async with session.post(url, json=update, headers=headers) as response:
+                        if response.status != 200:
+                            print(f"Webhook ответил {response.status}")
+                    await asyncio.sleep(interval)
+
+    def report(self) -> dict:
+        report = {"calls": self.calls, "payload_bytes": self.payload_bytes, "replies": len(self.latencies),
+                  "startup_seconds": self.startup}
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            report["latency_p50"] = statistics.median(latencies)
+            report["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            report["latency_max"] = latencies[-1]
+        return report
+
+
+def load_updates(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", default="benchmarks/sample_updates.jsonl",
+                        help="JSONL с записанными объектами Update")
+    parser.add_argument("--rate", type=float, default=1.0, help="обновлений в секунду")
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз проиграть запись")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates)
+    gen_count = sum(1 for update in updates if update.get("message", {}).get("text", "").startswith("/gen"))
+    api = FakeBotApi(updates, args.rate, args.repeat, expected_replies=gen_count * args.repeat)
+
+    app = web.Application(client_max_size=50 * 1024 * 1024)
+    app.router.add_route("*", "/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Заглушка Bot API слушает http://{args.host}:{args.port}/bot")
+
+    try:
+        await api.done.wait()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        print(json.dumps(api.report(), ensure_ascii=False, indent=2))
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,315 @@
+"""Офлайн нагрузочный тест всего конвейера /gen без Telegram.
+
+Гоняет BotManager.gen_command и диспетчер очереди на синтетических
+Update/CallbackContext поверх заглушки транспорта Telegram. Движок синтеза
+подключаемый: настоящий XTTS (--backend xtts) или быстрый детерминированный
+fake (--backend fake). Печатает и сохраняет в JSON p50/p95/p99 ожидания в очереди,
+синтеза, доставки, real-time factor, символы в секунду, пиковую RSS и пиковую
+память воркера по длине текста, чтобы сравнивать прогоны между коммитами.
+
+Пример:
+    python benchmarks/loadtest.py --backend fake --tasks 50 --rate 2 \\
+        --lengths uniform:20-200 --workers 2 --output bench_results/fake.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from metrics import StageTimings  # noqa: E402
+
+WORDS = (
+    "добрый вечер дорогие друзья сегодня мы поговорим о погоде экономике и планах на будущее "
+    "коллеги давайте двигаться дальше без лишней спешки но и без промедления потому что время "
+    "не ждет страна работает предприятия строятся дороги ремонтируются а граждане получают поддержку"
+).split()
+
+
+def make_text(rng: random.Random, length: int) -> str:
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rng.choice(WORDS))
+    text = " ".join(words)[:length].rstrip()
+    return text[0].upper() + text[1:] + "."
+
+
+def length_sampler(spec: str, rng: random.Random):
+    """fixed:N, uniform:A-B или choice:A,B,C"""
+    kind, _, value = spec.partition(":")
+    if kind == "fixed":
+        return lambda: int(value)
+    if kind == "uniform":
+        low, high = (int(x) for x in value.split("-"))
+        return lambda: rng.randint(low, high)
+    if kind == "choice":
+        options = [int(x) for x in value.split(",")]
+        return lambda: rng.choice(options)
+    raise ValueError(f"Неизвестное распределение длины: {spec}")
+
+
+def percentiles(values) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pick(q):
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "avg": sum(values) / len(values), "n": len(values)}
+
+
+class MockTelegram:
+    """Заглушка Bot API: отвечает сообщениями с id и имитирует задержку загрузки"""
+
+    def __init__(self, upload_latency: float, upload_seconds_per_mb: float):
+        self.upload_latency = upload_latency
+        self.upload_seconds_per_mb = upload_seconds_per_mb
+        self.next_message_id = 1000
+        self.calls = {}
+        self.uploaded_bytes = 0
+
+    def _message(self, method: str, **extra):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.next_message_id += 1
+        return SimpleNamespace(message_id=self.next_message_id, voice=None, audio=None, **extra)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return self._message("sendMessage")
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return self._message("editMessageText")
+
+    async def _upload(self, method, payload, field):
+        size = len(payload) if isinstance(payload, (bytes, bytearray)) else len(payload.read())
+        self.uploaded_bytes += size
+        await asyncio.sleep(self.upload_latency + self.upload_seconds_per_mb * size / 1024 / 1024)
+        media = SimpleNamespace(file_id=f"mock-{self.next_message_id}")
+        message = self._message(method)
+        setattr(message, field, media)
+        return message
+
+    async def send_voice(self, chat_id, voice, **kwargs):
+        return await self._upload("sendVoice", voice, "voice")
+
+    async def send_audio(self, chat_id, audio, **kwargs):
+        return await self._upload("sendAudio", audio, "audio")
+
+
+class RecordingStageTimings(StageTimings):
+    """Сохраняет сырые замеры каждого задания для точных перцентилей"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def observe(self, timings: dict, chars: int = 0):
+        super().observe(timings, chars=chars)
+        self.records.append(dict(timings, chars=chars))
+
+
+def make_update(transport: MockTelegram, user_id: int, message_id: int):
+    async def reply_text(text, **kwargs):
+        return transport._message("sendMessage")
+
+    return SimpleNamespace(
+        message=SimpleNamespace(message_id=message_id, reply_text=reply_text),
+        effective_user=SimpleNamespace(id=user_id, first_name=f"user{user_id}"),
+        effective_chat=SimpleNamespace(id=user_id),
+    )
+
+
+class RssSampler:
+    """Пиковая RSS бота вместе с процессами-воркерами"""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak_mb = None
+
+    async def run(self):
+        try:
+            import psutil
+        except ImportError:
+            return
+        process = psutil.Process()
+        self.peak_mb = 0.0
+        while True:
+            total = 0
+            for proc in [process] + process.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak_mb = max(self.peak_mb, total / 1024 / 1024)
+            await asyncio.sleep(self.interval)
+
+
+def write_config(args, tmp_dir: str) -> str:
+    """Конфигурация бота для прогона: основа из --config и переопределения из аргументов"""
+    data = {}
+    if os.path.exists(args.config):
+        with open(args.config, encoding="utf-8") as f:
+            data = json.load(f)
+
+    sample_path = data.get("path_default_sempl_voice", "p.wav")
+    if args.backend == "fake" and not os.path.exists(sample_path):
+        # Тестовому движку образец голоса не нужен, но по нему считается хэш голоса
+        sample_path = os.path.join(tmp_dir, "sample.wav")
+        with open(sample_path, "wb") as f:
+            f.write(b"fake voice sample")
+
+    data.update({
+        "token": data.get("token", "0:loadtest"),
+        "max_text_length": max(data.get("max_text_length", 500), args.max_length),
+        "min_text_length": data.get("min_text_length", 3),
+        "max_queue_size": args.tasks + 1,
+        "max_tasks_per_user": args.tasks + 1,
+        "path_default_sempl_voice": sample_path,
+        "tts_backend": args.backend,
+        "synthesis_workers": args.workers,
+        "streaming_mode": args.streaming,
+        "max_batch_size": args.max_batch_size,
+        "batch_window_ms": args.batch_window_ms,
+        "worker_memory_limit_mb": args.worker_memory_limit_mb,
+        "result_cache_enabled": False,
+        "queue_db_path": os.path.join(tmp_dir, "tasks.sqlite3"),
+    })
+    path = os.path.join(tmp_dir, "config.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    return path
+
+
+async def run_load(bot_manager, args, transport: MockTelegram) -> dict:
+    rng = random.Random(args.seed)
+    sample_length = length_sampler(args.lengths, rng)
+
+    sampler = RssSampler()
+    sampler_task = asyncio.create_task(sampler.run())
+    await bot_manager.resume_pending(transport)
+
+    start = time.perf_counter()
+    for idx in range(args.tasks):
+        if args.rate > 0:
+            await asyncio.sleep(rng.expovariate(args.rate))
+        user_id = rng.randint(1, args.users)
+        text = make_text(rng, sample_length())
+        context = SimpleNamespace(args=text.split(), bot=transport)
+        await bot_manager.gen_command(make_update(transport, user_id, idx + 1), context)
+
+    # Ждем, пока диспетчер обработает все задания
+    while len(bot_manager.stage_timings.records) < args.tasks:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    sampler_task.cancel()
+
+    records = bot_manager.stage_timings.records
+    total_chars = sum(record["chars"] for record in records)
+    total_synthesis = sum(record.get("synthesis", 0.0) for record in records)
+    results = {
+        stage: percentiles([record[stage] for record in records if stage in record])
+        for stage in ("queue_wait", "synthesis", "encode", "upload", "first_part", "total")
+    }
+    results["rtf"] = percentiles([
+        record["synthesis"] / record["audio_duration"]
+        for record in records if record.get("synthesis") and record.get("audio_duration")
+    ])
+    results["batch_size"] = percentiles([record.get("batch_size", 1) for record in records])
+    results["chars_per_second"] = total_chars / total_synthesis if total_synthesis else None
+    results["throughput_tasks_per_second"] = len(records) / elapsed
+    results["elapsed_seconds"] = elapsed
+    results["peak_rss_mb"] = sampler.peak_mb
+    results["worker_peak_rss_by_length"] = peak_memory_by_length(records, args.memory_bin_chars)
+    results["worker_recycles"] = bot_manager.memory_governor.recycles
+    results["synthesis_mb_per_char"] = bot_manager.memory_governor.mb_per_char
+    results["telegram_calls"] = transport.calls
+    results["uploaded_bytes"] = transport.uploaded_bytes
+    results["status_edits"] = dict(bot_manager.status_updater.stats)
+    return results
+
+
+def peak_memory_by_length(records: list, bin_chars: int) -> dict:
+    """Пиковый RSS воркера во время синтеза по корзинам длины текста"""
+    bins = {}
+    for record in records:
+        if "rss_peak_mb" not in record:
+            continue
+        low = record["chars"] // bin_chars * bin_chars
+        bins.setdefault(low, []).append(record["rss_peak_mb"])
+    return {
+        f"{low}-{low + bin_chars - 1}": {
+            "n": len(values),
+            "peak_rss_mb_max": max(values),
+            "peak_rss_mb_avg": sum(values) / len(values),
+        }
+        for low, values in sorted(bins.items())
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.json", help="основа конфигурации бота")
+    parser.add_argument("--backend", choices=("fake", "xtts"), default="fake")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=1.0, help="заданий в секунду (пуассоновский поток), 0 — все сразу")
+    parser.add_argument("--lengths", default="uniform:20-200", help="fixed:N, uniform:A-B или choice:A,B,C")
+    parser.add_argument("--max-length", type=int, default=500)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--max-batch-size", type=int, default=1, help="1 — без пакетного синтеза")
+    parser.add_argument("--batch-window-ms", type=int, default=50)
+    parser.add_argument("--worker-memory-limit-mb", type=float, default=0, help="потолок RSS воркера, 0 — без потолка")
+    parser.add_argument("--memory-bin-chars", type=int, default=50, help="ширина корзины длины для пиковой памяти")
+    parser.add_argument("--upload-latency", type=float, default=0.05, help="задержка загрузки в Telegram, с")
+    parser.add_argument("--upload-seconds-per-mb", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["BOT_CONFIG"] = write_config(args, tmp_dir)
+        import aittsbot
+
+        bot_manager = aittsbot.BotManager()
+        bot_manager.stage_timings = RecordingStageTimings()
+        bot_manager.initialize_tts()
+
+        transport = MockTelegram(args.upload_latency, args.upload_seconds_per_mb)
+        try:
+            results = asyncio.run(run_load(bot_manager, args, transport))
+        finally:
+            bot_manager.pool.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
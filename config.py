@@ -1,5 +1,5 @@
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 @dataclass
 class Config:
@@ -8,6 +8,67 @@ class Config:
     min_text_length: int
     max_queue_size: int
     path_default_sempl_voice: str
+    latents_cache_dir: str = "latents_cache"
+    voices_dir: str = "voices"  # образцы голосов <имя>.wav для /gen voice=<имя>
+    default_voice: str = "default"  # имя голоса path_default_sempl_voice
+    voice_latents_cache_mb: float = 64.0  # латенты голосов в памяти воркера (LRU), вытесненные читаются с диска
+    voice_prewarm_depth: int = 8  # сколько ближайших заданий очереди смотреть для прогрева голосов; 0 — без прогрева
+    synthesis_workers: int = 1
+    memory_governor_enabled: bool = True  # замер RSS на каждый синтез и освобождение памяти между заданиями
+    worker_memory_limit_mb: float = 0  # потолок RSS воркера: выше — перезапуск воркера; 0 — без потолка
+    synthesis_mb_per_char: float = 4.0  # начальная оценка прироста памяти на символ, уточняется по замерам
+    memory_sample_interval: float = 0.05
+    warmup_text: str = "Добрый день."  # пробный синтез после загрузки модели; пустая строка — без прогрева
+    torch_threads_per_worker: int = 0  # 0 — поделить доступные ядра поровну между воркерами
+    torch_interop_threads: int = 0  # 0 — значение torch по умолчанию
+    inference_precision: str = "fp32"  # fp32 или int8 (динамическая квантизация линейных слоев)
+    hifigan_backend: str = "torch"  # torch или onnx (нужен onnxruntime)
+    onnx_cache_dir: str = "cache/onnx"
+    streaming_mode: bool = False  # отправлять аудио по предложениям по мере готовности
+    segment_max_chars: int = 180  # длинный текст режется на сегменты не длиннее (окно токенов XTTS)
+    segment_crossfade_ms: float = 50.0  # перекрытие сегментов при склейке в одно аудио
+    max_batch_size: int = 1  # 1 — без пакетного синтеза; больше — совместный проход GPT для коротких запросов
+    batch_window_ms: int = 50  # сколько ждать попутчиков для пакета, если очередь короче max_batch_size
+    batch_max_chars: int = 180  # длиннее — синтез поодиночке (лимит предложения XTTS)
+    batch_bucket_chars: int = 40  # в пакет попадают тексты из одной корзины длины
+    result_cache_enabled: bool = True
+    result_cache_path: str = "cache/results.sqlite3"
+    result_cache_max_entries: int = 5000
+    result_cache_max_age_days: float = 30.0
+    audio_output: str = "voice"  # voice — OGG/Opus из памяти через sendVoice, wav_file — WAV через sendAudio
+    opus_bitrate: str = "32k"
+    queue_db_path: str = "cache/tasks.sqlite3"
+    role: str = "all"  # all — все в одном процессе; frontend — только прием /gen; worker — только синтез
+    broker: str = "sqlite"  # sqlite (файл queue_db_path, узлы на одной машине) или redis
+    broker_url: str = "redis://localhost:6379/0"
+    node_id: str = ""  # по умолчанию <hostname>-<role>; должен быть уникален для каждого узла
+    lease_seconds: float = 120.0  # аренда задания; узел продлевает ее heartbeat-ом, пока генерирует
+    max_attempts: int = 3  # сколько раз задание выдается заново после падения узла
+    heartbeat_interval: float = 10.0
+    broker_poll_interval: float = 0.5  # как часто узел-воркер проверяет общую очередь
+    max_tasks_per_user: int = 2
+    eta_overhead_seconds: float = 1.0  # начальная оценка времени задания: накладные расходы...
+    eta_seconds_per_char: float = 0.1  # ...плюс секунды на символ; уточняется по выполненным заданиям
+    max_backlog_seconds: float = 0  # лимит очереди в секундах оценки работы на воркер; 0 — без лимита
+    max_wait_seconds: float = 0  # отклонять /gen, если оценка готовности дольше; 0 — без дедлайна
+    eta_refresh_interval: float = 15.0  # как часто обновлять оценку в статусах ожидающих заданий
+    status_edits_per_second: int = 20
+    mode: str = "polling"  # polling или webhook
+    webhook_url: str = ""  # публичный адрес сервера, к нему добавляется webhook_path
+    webhook_path: str = "/telegram"
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_secret_token: str = ""
+    telegram_api_base_url: str = ""  # например http://127.0.0.1:8081/bot для заглушки Bot API
+    metrics_listen: str = "127.0.0.1"
+    metrics_port: int = 9108  # отдельный сервер /metrics на metrics_listen; 0 — выключить
+    log_format: str = "text"  # text (key=value) или json
+    log_level: str = "INFO"
+    admin_user_ids: list = field(default_factory=list)  # кому доступна команда /profile
+    profile_dir: str = "profiles"
+    profile_sample_interval: float = 0.005  # период сэмплирования стека при профилировании
+    tts_backend: str = "xtts"  # xtts или fake — детерминированная заглушка для нагрузочных тестов
+    fake_tts_chars_per_second: float = 50.0
 
 def load_config(path: str = 'config.json') -> Config:
     with open(path) as f:
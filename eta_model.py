@@ -0,0 +1,85 @@
+import heapq
+from datetime import datetime
+
+
+class SynthesisTimeModel:
+    """Время обработки задания воркером как линейная функция длины текста: a + b * символы.
+
+    Коэффициенты подбираются взвешенным методом наименьших квадратов по
+    выполненным заданиям; старые замеры затухают с коэффициентом decay, поэтому
+    модель следит за текущей нагрузкой хоста. Начальная оценка из конфигурации
+    входит в сумму как два псевдозамера и постепенно вытесняется реальными.
+    """
+
+    PRIOR_CHARS = (50, 200)
+
+    def __init__(self, overhead_seconds: float, seconds_per_char: float, decay: float = 0.98):
+        self.decay = decay
+        self.samples = 0
+        self._sums = [0.0] * 5  # веса, x, y, x², xy
+        for chars in self.PRIOR_CHARS:
+            self._add(chars, overhead_seconds + seconds_per_char * chars)
+        self.intercept = overhead_seconds
+        self.slope = seconds_per_char
+
+    def _add(self, chars: float, seconds: float):
+        self._sums = [value * self.decay for value in self._sums]
+        for idx, value in enumerate((1.0, chars, seconds, chars * chars, chars * seconds)):
+            self._sums[idx] += value
+
+    def observe(self, chars: int, seconds: float):
+        if chars <= 0 or seconds <= 0:
+            return
+        self._add(chars, seconds)
+        self.samples += 1
+
+        weight, sum_x, sum_y, sum_xx, sum_xy = self._sums
+        det = weight * sum_xx - sum_x * sum_x
+        if det > 1e-9:
+            slope = (weight * sum_xy - sum_x * sum_y) / det
+            intercept = (sum_y - slope * sum_x) / weight
+        else:
+            slope, intercept = sum_y / sum_x, 0.0
+        # Отрицательные коэффициенты не имеют смысла и дают нулевые ETA на коротких текстах
+        if slope < 0:
+            slope, intercept = 0.0, sum_y / weight
+        elif intercept < 0:
+            slope, intercept = sum_xy / sum_xx, 0.0
+        self.intercept, self.slope = intercept, slope
+
+    def predict(self, chars: int) -> float:
+        return self.intercept + self.slope * chars
+
+    def to_dict(self) -> dict:
+        return {"intercept": self.intercept, "slope": self.slope, "samples": self.samples}
+
+
+def estimate_completion(running: list, ordered: list, workers: int, predict) -> dict:
+    """Секунды до готовности каждого задания: {task_id: секунды}.
+
+    Симулирует раздачу заданий: генерируемые задания занимают воркеры на
+    оставшееся по оценке время, ожидающие в порядке планировщика уходят
+    на воркер, который освободится раньше всех.
+    """
+    now = datetime.now()
+    etas = {}
+    free_at = []
+    for task in running:
+        elapsed = (now - task.started_at).total_seconds() if task.started_at else 0.0
+        etas[task.task_id] = max(0.0, predict(len(task.text)) - elapsed)
+        free_at.append(etas[task.task_id])
+    free_at.extend([0.0] * max(0, workers - len(running)))
+    heapq.heapify(free_at)
+
+    for task in ordered:
+        finish = heapq.heappop(free_at) + predict(len(task.text))
+        etas[task.task_id] = finish
+        heapq.heappush(free_at, finish)
+    return etas
+
+
+def format_eta(seconds: float) -> str:
+    """Округленная оценка для пользователя; крупный шаг не дает правкам статуса дергаться"""
+    if seconds < 60:
+        return f"~{max(5, 5 * round(seconds / 5))} с"
+    return f"~{round(seconds / 60)} мин"
@@ -0,0 +1,105 @@
+import logging
+import os
+
+import torch
+
+# ONNX Runtime — необязательная зависимость для декодера HiFi-GAN
+try:
+    import onnxruntime
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+logger = logging.getLogger(__name__)
+
+
+def _conv1d_to_linear(module: torch.nn.Module):
+    """Заменяет Conv1D из transformers (GPT-2) на эквивалентные nn.Linear.
+
+    quantize_dynamic квантует только nn.Linear, а блоки GPT-2 внутри XTTS
+    построены на Conv1D с транспонированной матрицей весов.
+    """
+    for name, child in module.named_children():
+        if type(child).__name__ == "Conv1D" and hasattr(child, "nf"):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features, bias=child.bias is not None)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight.t())
+                if child.bias is not None:
+                    linear.bias.copy_(child.bias)
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+def quantize_int8(model):
+    """Динамическая int8-квантизация линейных слоев GPT и декодера XTTS"""
+    _conv1d_to_linear(model.gpt)
+    # inplace: gpt_inference ссылается на те же блоки трансформера, поэтому замена видна обоим
+    torch.ao.quantization.quantize_dynamic(model.gpt, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    torch.ao.quantization.quantize_dynamic(model.hifigan_decoder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class OnnxHifiganDecoder(torch.nn.Module):
+    """Декодер HiFi-GAN на ONNX Runtime с тем же интерфейсом, что у HifiDecoder.
+
+    Энкодер диктора остается на torch: через hifigan_decoder.speaker_encoder
+    XTTS кодирует образцы новых голосов.
+    """
+
+    def __init__(self, onnx_path: str, num_threads: int, speaker_encoder):
+        super().__init__()
+        self.speaker_encoder = speaker_encoder
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def forward(self, latents, g=None):
+        outputs = self.session.run(None, {
+            "latents": latents.detach().cpu().float().numpy(),
+            "g": g.detach().cpu().float().numpy(),
+        })
+        return torch.from_numpy(outputs[0])
+
+
+def export_hifigan_onnx(model, speaker_embedding, onnx_path: str):
+    """Экспортирует декодер HiFi-GAN в ONNX с динамической длиной латентов"""
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+    latent_dim = model.gpt.model_dim if hasattr(model.gpt, "model_dim") else 1024
+    dummy_latents = torch.randn(1, 32, latent_dim)
+
+    # Пишем во временный файл и переименовываем, чтобы не оставить битый экспорт
+    tmp_path = onnx_path + ".tmp"
+    with torch.inference_mode():
+        torch.onnx.export(
+            model.hifigan_decoder,
+            (dummy_latents, {"g": speaker_embedding}),
+            tmp_path,
+            input_names=["latents", "g"],
+            output_names=["wav"],
+            dynamic_axes={"latents": {1: "frames"}, "wav": {2: "samples"}},
+            opset_version=17
+        )
+    os.replace(tmp_path, onnx_path)
+
+
+def apply_inference_optimizations(model, config, speaker_embedding, model_key: str):
+    """Применяет выбранные в конфигурации оптимизации инференса на CPU"""
+    model.eval()
+
+    if config.hifigan_backend == "onnx":
+        if not HAS_ONNXRUNTIME:
+            logger.warning("onnxruntime не установлен, декодер HiFi-GAN остается на torch")
+        else:
+            onnx_path = os.path.join(config.onnx_cache_dir, f"hifigan_{model_key}.onnx")
+            if not os.path.exists(onnx_path):
+                logger.info("Экспорт декодера HiFi-GAN в ONNX: %s", onnx_path)
+                export_hifigan_onnx(model, speaker_embedding, onnx_path)
+            threads = torch.get_num_threads()
+            model.hifigan_decoder = OnnxHifiganDecoder(onnx_path, threads, model.hifigan_decoder.speaker_encoder)
+            logger.info("Декодер HiFi-GAN работает на ONNX Runtime")
+
+    if config.inference_precision == "int8":
+        quantize_int8(model)
+        logger.info("Применена динамическая int8-квантизация линейных слоев")
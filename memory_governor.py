@@ -0,0 +1,113 @@
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import threading
+
+from eta_model import SynthesisTimeModel
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_libc = None
+
+
+def current_rss_mb() -> float:
+    """RSS текущего процесса в МБ; на Linux читается из /proc без psutil"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1024 / 1024
+    except OSError:
+        import resource
+        # Вне Linux доступен только пиковый RSS процесса
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def release_memory():
+    """Освобождение памяти между заданиями: сборка мусора и возврат свободных страниц ОС.
+
+    На CPU torch не держит собственного кэша, освобожденные тензоры остаются
+    в куче glibc; malloc_trim возвращает их системе, и RSS перестает расти.
+    """
+    global _libc
+    gc.collect()
+    if _libc is None:
+        path = ctypes.util.find_library("c")
+        _libc = ctypes.CDLL(path) if path else False
+    if _libc and hasattr(_libc, "malloc_trim"):
+        _libc.malloc_trim(0)
+
+
+class PeakRssSampler:
+    """Фоновый поток, замеряющий пиковый RSS процесса на время синтеза"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+class MemoryGovernor:
+    """Решения по памяти воркеров синтеза в основном процессе.
+
+    По замерам каждого синтеза оценивает прирост памяти как накладные расходы
+    плюс мегабайты на символ текста, ограничивает длину текста так, чтобы
+    ожидаемый пик укладывался в потолок, и сообщает, когда воркер после задания
+    превысил потолок и его пора перезапустить.
+    """
+
+    def __init__(self, limit_mb: float, mb_per_char: float):
+        self.limit_mb = limit_mb
+        # Прирост памяти подбирается той же прямой a + b * символы с затуханием, что и время
+        # задания: постоянная часть не завышает оценку на символ по коротким текстам
+        self.growth = SynthesisTimeModel(0.0, mb_per_char)
+        self.baseline_mb = 0.0
+        self.recycles = 0
+
+    @property
+    def mb_per_char(self) -> float:
+        return self.growth.slope
+
+    @property
+    def overhead_mb(self) -> float:
+        return self.growth.intercept
+
+    def observe_baseline(self, rss_mb: float):
+        """RSS воркера сразу после загрузки и прогрева модели"""
+        self.baseline_mb = max(self.baseline_mb, rss_mb)
+
+    def observe(self, chars: int, memory: dict):
+        if not chars or not memory:
+            return
+        self.growth.observe(chars, memory["peak"] - memory["before"])
+
+    def estimate_peak_mb(self, chars: int) -> float:
+        return self.baseline_mb + self.growth.predict(chars)
+
+    def max_chars(self, default: int) -> int:
+        """Наибольшая длина текста, чей ожидаемый пик укладывается в потолок"""
+        if not self.limit_mb or not self.baseline_mb or not self.mb_per_char:
+            return default
+        headroom = self.limit_mb - self.baseline_mb - self.overhead_mb
+        return max(1, min(default, int(headroom / self.mb_per_char)))
+
+    def should_recycle(self, rss_after_mb: float) -> bool:
+        return bool(self.limit_mb and rss_after_mb and rss_after_mb > self.limit_mb)
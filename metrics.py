@@ -0,0 +1,236 @@
+import bisect
+import os
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+# Границы корзин в секундах: от долей секунды (отправка) до минут (синтез длинного текста)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и оценкой квантилей"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя корзина — +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for idx, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                if idx == len(self.buckets):
+                    return lower
+                upper = self.buckets[idx]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def exposition(self, name: str, labels: str = "") -> list:
+        """Строки гистограммы в текстовом формате Prometheus (корзины накопительные)"""
+        sep = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class StageTimings:
+    """Агрегированные длительности этапов обработки заданий"""
+
+    STAGES = ("queue_wait", "synthesis", "encode", "upload", "first_part", "total")
+
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in self.STAGES}
+        # Real-time factor (секунды синтеза на секунду аудио) и скорость синтеза в символах
+        self.histograms["rtf"] = Histogram()
+        self.histograms["chars_per_second"] = Histogram()
+
+    def observe(self, timings: dict, chars: int = 0):
+        for stage, value in timings.items():
+            if stage in self.STAGES and value is not None:
+                self.histograms[stage].observe(value)
+
+        if timings.get("synthesis") and timings.get("audio_duration"):
+            self.histograms["rtf"].observe(timings["synthesis"] / timings["audio_duration"])
+        if chars and timings.get("synthesis"):
+            self.histograms["chars_per_second"].observe(chars / timings["synthesis"])
+
+    def summary_lines(self) -> list:
+        lines = []
+        for stage, histogram in self.histograms.items():
+            if histogram.count:
+                unit = "" if stage in ("rtf", "chars_per_second") else " с"
+                lines.append(
+                    f"{stage}: n={histogram.count}, avg={histogram.avg:.2f}{unit}, "
+                    f"p50={histogram.quantile(0.5):.2f}{unit}, p95={histogram.quantile(0.95):.2f}{unit}"
+                )
+        return lines
+
+    def collect(self) -> list:
+        """Гистограммы этапов для /metrics; считаются из уже накопленных данных при опросе"""
+        lines = [
+            "# HELP aittsbot_stage_seconds Длительность этапов обработки задания",
+            "# TYPE aittsbot_stage_seconds histogram",
+        ]
+        for stage in self.STAGES:
+            lines.extend(self.histograms[stage].exposition("aittsbot_stage_seconds", f'stage="{stage}"'))
+        for name, documentation in (("rtf", "Real-time factor синтеза"),
+                                    ("chars_per_second", "Скорость синтеза в символах в секунду")):
+            lines.append(f"# HELP aittsbot_{name} {documentation}")
+            lines.append(f"# TYPE aittsbot_{name} histogram")
+            lines.extend(self.histograms[name].exposition(f"aittsbot_{name}"))
+        return lines
+
+
+def _format_labels(labelnames: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+
+
+class Counter:
+    """Монотонный счетчик с метками; инкремент — одна операция со словарем.
+
+    С func значение не копится, а считывается в момент опроса /metrics из уже
+    существующей статистики: func возвращает число или, для метрики с одной
+    меткой, словарь {значение метки: число}.
+    """
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), func=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.func = func
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def _samples(self):
+        if self.func is None:
+            return self.values.items()
+        value = self.func()
+        if isinstance(value, dict):
+            return [((label,), item) for label, item in value.items()]
+        return [((), value)] if value is not None else []
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for key, value in self._samples():
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """Текущее значение; как и у Counter, может считываться через func при опросе"""
+
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[tuple(labels.get(name, "") for name in self.labelnames)] = value
+
+
+class Registry:
+    """Реестр метрик с выдачей в текстовом формате Prometheus.
+
+    Коллектор — объект с методом collect() или функция без аргументов,
+    возвращающие строки экспозиции.
+    """
+
+    def __init__(self):
+        self.collectors = []
+
+    def register(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def counter(self, name: str, documentation: str, labelnames=(), func=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, func))
+
+    def gauge(self, name: str, documentation: str, labelnames=(), func=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, func))
+
+    def render(self) -> str:
+        lines = []
+        for collector in self.collectors:
+            lines.extend(collector() if callable(collector) else collector.collect())
+        return "\n".join(lines) + "\n"
+
+
+class ProcessCollector:
+    """RSS и процессорное время бота и процессов-воркеров синтеза (нужен psutil)"""
+
+    def __init__(self):
+        self.process = psutil.Process(os.getpid()) if HAS_PSUTIL else None
+
+    def _processes(self):
+        yield "main", self.process
+        for child in self.process.children(recursive=True):
+            yield "worker", child
+
+    def memory_mb(self) -> dict:
+        """RSS в МБ: основной процесс и сумма по воркерам"""
+        usage = {"main": 0.0, "worker": 0.0}
+        for role, process in self._processes():
+            try:
+                usage[role] += process.memory_info().rss / 1024 / 1024
+            except psutil.Error:
+                pass
+        return usage
+
+    def collect(self) -> list:
+        if self.process is None:
+            return []
+        rss = {"main": 0, "worker": 0}
+        cpu = {"main": 0.0, "worker": 0.0}
+        for role, process in self._processes():
+            try:
+                rss[role] += process.memory_info().rss
+                times = process.cpu_times()
+                cpu[role] += times.user + times.system
+            except psutil.Error:
+                pass
+        return [
+            "# HELP aittsbot_process_resident_memory_bytes RSS процессов бота",
+            "# TYPE aittsbot_process_resident_memory_bytes gauge",
+            *(f'aittsbot_process_resident_memory_bytes{{process="{role}"}} {value}' for role, value in rss.items()),
+            "# HELP aittsbot_process_cpu_seconds_total Процессорное время user+system",
+            "# TYPE aittsbot_process_cpu_seconds_total counter",
+            *(f'aittsbot_process_cpu_seconds_total{{process="{role}"}} {value}' for role, value in cpu.items()),
+        ]
+
+
+def format_timings(timings: dict) -> str:
+    # Целые значения — счетчики (например, размер пакета), а не длительности
+    return ", ".join(
+        f"{stage} {value}" if isinstance(value, int) else f"{stage} {value:.2f} с"
+        for stage, value in timings.items() if value is not None
+    )
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metrics_handler(registry, in_thread: bool = False):
+    """Обработчик GET /metrics; метрики собираются в момент опроса.
+
+    С in_thread сбор идет в потоке: часть метрик читает сетевой брокер очереди.
+    """
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        body = await asyncio.to_thread(registry.render) if in_thread else registry.render()
+        return web.Response(body=body.encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    return handle_metrics
+
+
+async def start_metrics_server(registry, listen: str, port: int, in_thread: bool = False) -> web.AppRunner:
+    """Отдельный HTTP-сервер с /metrics для режима long polling"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler(registry, in_thread))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, listen, port).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", listen, port)
+    return runner
@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Этапы синтеза XTTS: (этап, атрибут модели, метод), замеряются только в профилируемом задании
+STAGE_HOOKS = (
+    ("text_preprocessing", "tokenizer", "encode"),
+    ("gpt_autoregression", "gpt", "generate"),
+    ("gpt_latents", "gpt", "forward"),
+    ("hifigan_decoding", "hifigan_decoder", "forward"),
+)
+
+
+class StackSampler:
+    """Сэмплирующий профайлер CPU: стек одного потока раз в interval секунд.
+
+    Результат — свернутые стеки (folded), которые читают flamegraph.pl и speedscope.
+    Пока torch считает в C++, поток отпускает GIL, и в стеке виден вызвавший его код Python.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class StageTimer:
+    """Временно оборачивает методы модели XTTS и суммирует время по этапам"""
+
+    def __init__(self, model):
+        self.model = model
+        self.stages = dict.fromkeys((stage for stage, _, _ in STAGE_HOOKS), 0.0)
+        self._patched = []
+
+    def _wrap(self, stage: str, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.stages[stage] += time.perf_counter() - start
+        return timed
+
+    def __enter__(self):
+        for stage, attribute, name in STAGE_HOOKS:
+            target = getattr(self.model, attribute, None)
+            if target is not None and hasattr(target, name):
+                # Атрибут экземпляра перекрывает метод класса; после задания возвращаем как было
+                own = vars(target).get(name)
+                setattr(target, name, self._wrap(stage, getattr(target, name)))
+                self._patched.append((target, name, own))
+        return self
+
+    def __exit__(self, *exc_info):
+        for target, name, own in reversed(self._patched):
+            if own is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, own)
+        self._patched = []
+
+
+def profile_call(mode: str, profile_dir: str, label: str, model, sample_interval: float, fn, *args):
+    """Выполняет fn(*args) под профайлерами и пишет результаты в отдельный каталог.
+
+    Всегда: сэмплы CPU (cpu.folded), топ аллокаций Python (alloc.txt) и разбивка
+    по этапам (stages.json). В режиме torch еще трасса torch.profiler для
+    chrome://tracing (torch_trace.json) и таблица операторов (torch_ops.txt).
+    К результатам fn добавляется сводка: каталог и время этапов.
+    """
+    path = os.path.join(profile_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{label}_{os.getpid()}")
+    os.makedirs(path, exist_ok=True)
+
+    torch_profiler = None
+    if mode == "torch":
+        import torch
+        torch_profiler = torch.profiler.profile(
+            activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True, profile_memory=True
+        )
+
+    stage_timer = StageTimer(model) if model is not None else None
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            sampler = stack.enter_context(StackSampler(threading.get_ident(), sample_interval))
+            if stage_timer:
+                stack.enter_context(stage_timer)
+            if torch_profiler:
+                stack.enter_context(torch_profiler)
+            output = fn(*args)
+        total = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    results = output if isinstance(output, list) else [output]
+    stages = dict(stage_timer.stages) if stage_timer else {}
+    stages["encode"] = sum(result.timings.get("encode", 0.0) for result in results)
+    stages["other"] = max(0.0, total - sum(stages.values()))
+    stages["total"] = total
+
+    sampler.write_folded(os.path.join(path, "cpu.folded"))
+    with open(os.path.join(path, "alloc.txt"), "w") as f:
+        f.write(f"Пик памяти, отслеженной tracemalloc: {traced_peak / 1024 / 1024:.1f} МБ\n\n")
+        for stat in snapshot.statistics("lineno")[:50]:
+            f.write(f"{stat}\n")
+    with open(os.path.join(path, "stages.json"), "w") as f:
+        json.dump({"label": label, "mode": mode, "samples": sum(sampler.stacks.values()), "stages": stages}, f,
+                  ensure_ascii=False, indent=2)
+    if torch_profiler:
+        torch_profiler.export_chrome_trace(os.path.join(path, "torch_trace.json"))
+        with open(os.path.join(path, "torch_ops.txt"), "w") as f:
+            f.write(torch_profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=50))
+
+    logger.info("Профиль задания записан", extra={"path": path, "total": round(total, 3)})
+    for result in results:
+        result.profile = {"path": path, "stages": stages}
+    return output
@@ -0,0 +1,260 @@
+import json
+import time
+from datetime import datetime
+
+from task_store import AudioTask, fair_order, pick_batch
+
+# Клиент Redis — необязательная зависимость, нужна только для broker = "redis"
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+# Переходы задания между множествами делаются Lua-скриптами: Redis выполняет скрипт целиком,
+# поэтому узел, упавший посреди перехода, не оставляет задание вне всех множеств.
+
+# KEYS: pending, task:<id>, leases, user_service; ARGV: id, узел, сейчас, срок аренды, пользователь
+_CLAIM_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return false
+end
+local attempts = redis.call('HINCRBY', KEYS[2], 'attempts', 1)
+redis.call('HSET', KEYS[2], 'leased_by', ARGV[2], 'started_at', ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+redis.call('HSET', KEYS[4], ARGV[5], ARGV[3])
+return attempts
+"""
+
+# KEYS: leases, task:<id>, pending; ARGV: id, max_attempts (0 — без лимита),
+# узел-арендатор ('' — любой), аренда истекла до ('' — не проверять).
+# Возвращает 0 — не тронуто, 1 — возвращено в очередь, 2 — попытки исчерпаны, задание удалено
+_RELEASE_SCRIPT = """
+local lease_until = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not lease_until then
+    return 0
+end
+if ARGV[4] ~= '' and tonumber(lease_until) >= tonumber(ARGV[4]) then
+    return 0
+end
+if ARGV[3] ~= '' and redis.call('HGET', KEYS[2], 'leased_by') ~= ARGV[3] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+local attempts = tonumber(redis.call('HGET', KEYS[2], 'attempts') or '0')
+if tonumber(ARGV[2]) > 0 and attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[2])
+    return 2
+end
+redis.call('HDEL', KEYS[2], 'leased_by')
+redis.call('ZADD', KEYS[3], ARGV[1], ARGV[1])
+return 1
+"""
+
+# KEYS: new, task:<id>, pending; ARGV: id, узел. Неактивированные задания других узлов не трогаем
+_RECOVER_NEW_SCRIPT = """
+local owner = redis.call('HGET', KEYS[2], 'added_by')
+if owner and owner ~= ARGV[2] then
+    return 0
+end
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[3], ARGV[1], ARGV[1])
+return 1
+"""
+
+
+class RedisTaskStore:
+    """Очередь заданий в Redis с тем же интерфейсом, что у TaskStore.
+
+    Позволяет держать фронтенд бота и узлы-воркеры на разных машинах.
+    Задание хранится в хэше task:<id>; ожидающие — в ZSET pending (score — id),
+    арендованные — в ZSET leases (score — срок аренды), еще не активированные — в ZSET new.
+    Переходы между множествами атомарны (Lua): задание получает тот узел,
+    чей скрипт выдачи снял его из pending.
+    """
+
+    # Redis — сетевой брокер: вызовы из цикла событий бот выполняет в отдельном потоке
+    remote = True
+
+    _FIELDS = ("text", "chat_id", "message_id", "user_id", "user_name",
+               "status_message_id", "created_at", "cache_key", "attempts", "voice")
+
+    def __init__(self, url: str, node_id: str = "local", lease_seconds: float = 600.0,
+                 max_attempts: int = 3, prefix: str = "aittsbot"):
+        if not HAS_REDIS:
+            raise RuntimeError("Для broker = \"redis\" установите пакет redis: pip install redis")
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self._claim_script = self.redis.register_script(_CLAIM_SCRIPT)
+        self._release_script = self.redis.register_script(_RELEASE_SCRIPT)
+        self._recover_new_script = self.redis.register_script(_RECOVER_NEW_SCRIPT)
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def _load(self, task_ids) -> list:
+        pipe = self.redis.pipeline()
+        for task_id in task_ids:
+            pipe.hgetall(self._key("task", task_id))
+        tasks = []
+        for task_id, data in zip(task_ids, pipe.execute()):
+            if not data:
+                continue  # задание удалили между чтениями
+            tasks.append(AudioTask(
+                task_id=int(task_id), text=data["text"], chat_id=int(data["chat_id"]),
+                message_id=int(data["message_id"]), user_id=int(data["user_id"]), user_name=data["user_name"],
+                status_message_id=int(data["status_message_id"]) if data.get("status_message_id") else None,
+                created_at=datetime.fromtimestamp(float(data["created_at"])),
+                cache_key=data.get("cache_key") or None, attempts=int(data.get("attempts", 0)),
+                voice=data.get("voice") or None,
+                started_at=datetime.fromtimestamp(float(data["started_at"])) if data.get("started_at") else None
+            ))
+        return tasks
+
+    def add(self, task: AudioTask) -> int:
+        task.task_id = self.redis.incr(self._key("next_id"))
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key("task", task.task_id), mapping={
+            "text": task.text, "chat_id": task.chat_id, "message_id": task.message_id,
+            "user_id": task.user_id, "user_name": task.user_name,
+            "status_message_id": task.status_message_id or "", "created_at": task.created_at.timestamp(),
+            "cache_key": task.cache_key or "", "attempts": 0, "voice": task.voice or "",
+            "added_by": self.node_id,
+        })
+        pipe.zadd(self._key("new"), {task.task_id: time.time()})
+        pipe.execute()
+        return task.task_id
+
+    def activate(self, task: AudioTask):
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key("task", task.task_id), "status_message_id", task.status_message_id or "")
+        pipe.zrem(self._key("new"), task.task_id)
+        pipe.zadd(self._key("pending"), {task.task_id: task.task_id})
+        pipe.execute()
+
+    def recover(self) -> int:
+        """Возвращает в очередь задания, арендованные или добавленные и не активированные этим узлом"""
+        recovered = 0
+        for task_id in self.redis.zrange(self._key("leases"), 0, -1):
+            recovered += self._release(task_id, node_id=self.node_id) == 1
+        for task_id in self.redis.zrange(self._key("new"), 0, -1):
+            recovered += self._recover_new_script(
+                keys=[self._key("new"), self._key("task", task_id), self._key("pending")],
+                args=[task_id, self.node_id]
+            )
+        return recovered
+
+    def ordered_pending(self, include_task_id: int = None) -> list:
+        task_ids = self.redis.zrange(self._key("pending"), 0, -1)
+        if include_task_id is not None and str(include_task_id) not in task_ids:
+            task_ids = sorted(task_ids + [str(include_task_id)], key=int)
+        last_served = {int(user_id): float(value)
+                       for user_id, value in self.redis.hgetall(self._key("user_service")).items()}
+        return fair_order(self._load(task_ids), last_served)
+
+    def _claim(self, pick) -> list:
+        ordered = self.ordered_pending()
+        if not ordered:
+            return []
+        claimed = []
+        now = time.time()
+        for task in pick(ordered):
+            attempts = self._claim_script(
+                keys=[self._key("pending"), self._key("task", task.task_id), self._key("leases"),
+                      self._key("user_service")],
+                args=[task.task_id, self.node_id, now, now + self.lease_seconds, task.user_id]
+            )
+            # Другой узел мог забрать задание после чтения очереди — берем только выигранные
+            if attempts is None:
+                continue
+            task.attempts = int(attempts)
+            task.started_at = datetime.fromtimestamp(now)
+            claimed.append(task)
+        return claimed
+
+    def claim_next(self):
+        tasks = self._claim(lambda ordered: ordered[:1])
+        return tasks[0] if tasks else None
+
+    def claim_batch(self, max_size: int, max_chars: int, bucket_chars: int) -> list:
+        return self._claim(lambda ordered: pick_batch(ordered, max_size, max_chars, bucket_chars))
+
+    def extend_leases(self, task_ids: list):
+        lease_until = time.time() + self.lease_seconds
+        for task_id in task_ids:
+            if self.redis.hget(self._key("task", task_id), "leased_by") == self.node_id:
+                # XX: не возвращаем аренду, которую уже сняли как истекшую
+                self.redis.zadd(self._key("leases"), {task_id: lease_until}, xx=True)
+
+    def _release(self, task_id, max_attempts: int = 0, node_id: str = "", expired_before: float = None) -> int:
+        """Снимает аренду задания: 1 — задание снова в очереди, 2 — удалено по лимиту попыток, 0 — не тронуто"""
+        return self._release_script(
+            keys=[self._key("leases"), self._key("task", task_id), self._key("pending")],
+            args=[task_id, max_attempts, node_id, "" if expired_before is None else expired_before]
+        )
+
+    def requeue_expired(self) -> list:
+        failed = []
+        now = time.time()
+        for task_id in self.redis.zrangebyscore(self._key("leases"), "-inf", now):
+            # Данные читаем заранее: при исчерпании попыток скрипт удалит задание
+            tasks = self._load([task_id])
+            # Аренду могли продлить или уже снять другим узлом — скрипт это проверяет
+            if self._release(task_id, self.max_attempts, expired_before=now) == 2 and tasks:
+                failed.append(tasks[0])
+        return failed
+
+    def requeue(self, task: AudioTask) -> bool:
+        return self._release(task.task_id, self.max_attempts, node_id=self.node_id) != 2
+
+    def oldest_pending_age(self) -> float:
+        task_ids = self.redis.zrange(self._key("pending"), 0, 0)
+        if not task_ids:
+            return 0.0
+        created_at = self.redis.hget(self._key("task", task_ids[0]), "created_at")
+        return time.time() - float(created_at) if created_at else 0.0
+
+    def complete(self, task: AudioTask):
+        pipe = self.redis.pipeline()
+        for state in ("new", "pending", "leases"):
+            pipe.zrem(self._key(state), task.task_id)
+        pipe.delete(self._key("task", task.task_id))
+        pipe.execute()
+
+    def remove(self, task: AudioTask):
+        self.complete(task)
+
+    def count_pending(self) -> int:
+        return self.redis.zcard(self._key("pending"))
+
+    def running_tasks(self) -> list:
+        return self._load(self.redis.zrange(self._key("leases"), 0, -1))
+
+    def count_running(self) -> int:
+        return self.redis.zcard(self._key("leases"))
+
+    def count_user_active(self, user_id: int) -> int:
+        task_ids = []
+        for state in ("new", "pending", "leases"):
+            task_ids.extend(self.redis.zrange(self._key(state), 0, -1))
+        pipe = self.redis.pipeline()
+        for task_id in task_ids:
+            pipe.hget(self._key("task", task_id), "user_id")
+        return sum(1 for value in pipe.execute() if value is not None and int(value) == user_id)
+
+    def heartbeat(self, info: dict):
+        self.redis.hset(self._key("nodes"), self.node_id,
+                        json.dumps({"last_seen": time.time(), "info": info}, ensure_ascii=False))
+
+    def nodes(self) -> list:
+        now = time.time()
+        result = []
+        for node_id, value in sorted(self.redis.hgetall(self._key("nodes")).items()):
+            data = json.loads(value)
+            result.append((node_id, now - data["last_seen"], data["info"]))
+        return result
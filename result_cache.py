@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста для ключа кэша: регистр и пробелы не влияют на результат"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class ResultCache:
+    """Кэш готовых аудио по содержимому запроса.
+
+    Хранит file_id, который вернул Telegram при первой отправке, поэтому
+    повторная фраза отправляется без синтеза и без повторной загрузки файла.
+    Записи вытесняются по LRU при превышении max_entries и удаляются после max_age_days.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_age_days: float):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " file_id TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used_at REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used_at)")
+        self.db.commit()
+        self._evict()
+
+    @staticmethod
+    def make_key(text: str, voice_hash: str, language: str, model_version: str,
+                 precision: str, hifigan_backend: str) -> str:
+        """Ключ по всему, что меняет звук: int8 и ONNX-декодер дают другое аудио, чем fp32 на torch"""
+        raw = "\0".join([normalize_text(text), voice_hash, language, model_version, precision, hifigan_backend])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Возвращает (file_id, kind) или None"""
+        row = self.db.execute(
+            "SELECT file_id, kind, created_at FROM results WHERE key = ?", (key,)
+        ).fetchone()
+
+        now = time.time()
+        if row is None or now - row[2] > self.max_age_seconds:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.db.execute(
+            "UPDATE results SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+        )
+        self.db.commit()
+        return row[0], row[1]
+
+    def put(self, key: str, file_id: str, kind: str):
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO results (key, file_id, kind, created_at, last_used_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, file_id, kind, now, now)
+        )
+        self.db.commit()
+        self._evict()
+
+    def remove(self, key: str):
+        self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+        self.db.commit()
+
+    def size(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _evict(self):
+        """Удаляет устаревшие записи и самые давно использованные сверх лимита"""
+        self.db.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        self.db.execute(
+            "DELETE FROM results WHERE key IN ("
+            " SELECT key FROM results ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self.db.commit()
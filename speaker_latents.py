@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: str) -> str:
+    """Возвращает sha256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SpeakerLatentsCache:
+    """Дисковый кэш латентов диктора XTTS.
+
+    Ключ кэша — хэш содержимого образца голоса и версия модели, поэтому
+    замена p.wav или обновление модели автоматически приводят к пересчету.
+    """
+
+    def __init__(self, cache_dir: str, model_version: str):
+        self.cache_dir = cache_dir
+        self.model_version = model_version
+
+    def _cache_path(self, sample_hash: str) -> str:
+        model_key = hashlib.sha256(self.model_version.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{sample_hash}_{model_key}.pt")
+
+    def load(self, sample_path: str):
+        """Возвращает (gpt_cond_latent, speaker_embedding) из кэша или None"""
+        # torch нужен только воркерам синтеза; основной процесс бота его не импортирует
+        import torch
+
+        cache_path = self._cache_path(file_sha256(sample_path))
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            data = torch.load(cache_path, map_location="cpu")
+            logger.info("Латенты диктора загружены из кэша: %s", cache_path)
+            return data["gpt_cond_latent"], data["speaker_embedding"]
+        except Exception as e:
+            logger.warning("Не удалось прочитать кэш латентов %s: %s", cache_path, e)
+            return None
+
+    def compute(self, model, sample_path: str):
+        """Кодирует образец голоса моделью и сохраняет латенты в кэш"""
+        import torch
+
+        logger.info("Вычисление латентов диктора для %s", sample_path)
+        gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(audio_path=[sample_path])
+
+        cache_path = self._cache_path(file_sha256(sample_path))
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Пишем во временный файл и переименовываем, чтобы не оставить битый кэш
+            tmp_path = cache_path + ".tmp"
+            torch.save({
+                "gpt_cond_latent": gpt_cond_latent,
+                "speaker_embedding": speaker_embedding,
+                "model_version": self.model_version,
+            }, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning("Не удалось сохранить кэш латентов %s: %s", cache_path, e)
+
+        return gpt_cond_latent, speaker_embedding
+
+    def load_or_compute(self, model, sample_path: str):
+        """Возвращает (gpt_cond_latent, speaker_embedding) для образца голоса"""
+        return self.load(sample_path) or self.compute(model, sample_path)
+
+
+class VoiceLatents:
+    """Латенты нескольких голосов в памяти воркера.
+
+    LRU с ограничением по объему тензоров: вытесненный голос при следующем
+    обращении читается с диска (SpeakerLatentsCache), а не кодируется заново.
+    Самый свежий голос остается в памяти, даже если один превышает лимит.
+    """
+
+    def __init__(self, disk_cache: SpeakerLatentsCache, max_mb: float):
+        self.disk_cache = disk_cache
+        self.max_bytes = max_mb * 1024 * 1024
+        self.entries = OrderedDict()  # имя голоса -> (путь к образцу, латенты, байты)
+        self.size_bytes = 0
+        # hit/miss — обращения синтеза; disk/computed — откуда загружены латенты, включая прогрев
+        self.stats = dict.fromkeys(("hit", "miss", "disk", "computed"), 0)
+
+    def get(self, model, name: str, sample_path: str):
+        """Латенты голоса для синтеза"""
+        entry = self.entries.get(name)
+        if entry is not None and entry[0] == sample_path:
+            self.entries.move_to_end(name)
+            self.stats["hit"] += 1
+            return entry[1]
+        self.stats["miss"] += 1
+        return self._load(model, name, sample_path)
+
+    def prewarm(self, model, name: str, sample_path: str):
+        """Загружает латенты голоса заранее; на статистику попаданий не влияет"""
+        if name not in self.entries:
+            self._load(model, name, sample_path)
+
+    def _load(self, model, name: str, sample_path: str):
+        latents = self.disk_cache.load(sample_path)
+        if latents is None:
+            latents = self.disk_cache.compute(model, sample_path)
+            self.stats["computed"] += 1
+        else:
+            self.stats["disk"] += 1
+
+        self._drop(name)
+        size = sum(tensor.numel() * tensor.element_size() for tensor in latents)
+        self.entries[name] = (sample_path, latents, size)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes and len(self.entries) > 1:
+            self._drop(next(iter(self.entries)))
+        return latents
+
+    def _drop(self, name: str):
+        entry = self.entries.pop(name, None)
+        if entry is not None:
+            self.size_bytes -= entry[2]
+
+    def info(self) -> dict:
+        """Сводка для основного процесса: голоса в памяти, объем и счетчики"""
+        return {"voices": list(self.entries), "bytes": self.size_bytes, **self.stats}
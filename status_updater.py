@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket для контроля частоты запросов.
+
+    Ведро вмещает max_requests токенов и пополняется равномерно за period,
+    поэтому допускает короткий всплеск и держит среднюю частоту.
+    """
+    def __init__(self, max_requests: int, period: timedelta):
+        self.capacity = max_requests
+        self.refill_rate = max_requests / period.total_seconds()
+        self.tokens = float(max_requests)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def allow(self) -> bool:
+        """Неблокирующая проверка: забирает токен, если он есть"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> bool:
+        """Ждет токен; возвращает True, если пришлось ждать (сработало ограничение)"""
+        throttled = False
+        while not self.allow():
+            throttled = True
+            await asyncio.sleep((1 - self.tokens) / self.refill_rate)
+        return throttled
+
+
+class StatusUpdater:
+    """Фоновое обновление статусных сообщений заданий.
+
+    Запросы на правку объединяются по сообщению (отправляется только
+    последний текст), правки с неизменившимся текстом пропускаются,
+    остальные отправляются параллельно под общим ограничением частоты.
+    Вызывающий код не ждет Telegram и не блокирует выдачу следующего задания.
+    """
+
+    def __init__(self, max_edits: int, period: timedelta):
+        self.bot = None
+        self.rate_limiter = RateLimiter(max_edits, period)
+        self.pending = {}
+        self.last_sent = {}
+        self.in_flight = set()
+        self.finished = set()
+        self.wakeup = asyncio.Event()
+        self.runner = None
+        self.stats = {"requested": 0, "coalesced": 0, "skipped": 0, "sent": 0, "failed": 0, "throttled": 0}
+
+    def start(self, bot):
+        self.bot = bot
+        if self.runner is None:
+            self.runner = asyncio.create_task(self._run())
+
+    def request(self, chat_id: int, message_id: int, text: str):
+        """Ставит правку сообщения в очередь; не ждет отправки"""
+        key = (chat_id, message_id)
+        self.stats["requested"] += 1
+
+        if key in self.pending:
+            self.stats["coalesced"] += 1
+        if self.last_sent.get(key) == text and key not in self.in_flight:
+            # Текст не изменился — Telegram все равно вернул бы ошибку "message is not modified"
+            self.pending.pop(key, None)
+            self.stats["skipped"] += 1
+            return
+
+        self.pending[key] = text
+        self.wakeup.set()
+
+    def forget(self, chat_id: int, message_id: int):
+        """Освобождает память о сообщении после финального статуса"""
+        key = (chat_id, message_id)
+        if key in self.pending or key in self.in_flight:
+            # Финальная правка еще не отправлена — забудем сообщение после нее
+            self.finished.add(key)
+        else:
+            self.last_sent.pop(key, None)
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            # Сообщения, правка которых еще отправляется, ждут следующего прохода,
+            # чтобы старый текст не перезаписал новый
+            batch = {key: text for key, text in self.pending.items() if key not in self.in_flight}
+            for key in batch:
+                del self.pending[key]
+                self.in_flight.add(key)
+
+            for key, text in batch.items():
+                asyncio.create_task(self._send(key, text))
+
+    async def _send(self, key, text: str):
+        chat_id, message_id = key
+        try:
+            while True:
+                if await self.rate_limiter.acquire():
+                    self.stats["throttled"] += 1
+                try:
+                    await self.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+                    self.last_sent[key] = text
+                    self.stats["sent"] += 1
+                    return
+                except RetryAfter as e:
+                    # Telegram попросил подождать — уважаем flood control и пробуем снова
+                    self.stats["throttled"] += 1
+                    await asyncio.sleep(e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds")
+                                        else e.retry_after)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning("Ошибка при обновлении статусного сообщения: %s", e,
+                           extra={"chat_id": chat_id, "message_id": message_id})
+        finally:
+            self.in_flight.discard(key)
+            if key in self.pending:
+                self.wakeup.set()
+            elif key in self.finished:
+                self.finished.discard(key)
+                self.last_sent.pop(key, None)
+
+    def summary(self) -> str:
+        return (f"отправлено {self.stats['sent']}, объединено {self.stats['coalesced']}, "
+                f"пропущено {self.stats['skipped']}, ограничений частоты {self.stats['throttled']}, "
+                f"ошибок {self.stats['failed']}")
@@ -0,0 +1,172 @@
+import os
+import logging
+import concurrent.futures
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+
+import tts_engine
+
+logger = logging.getLogger(__name__)
+
+
+class SynthesisWorker:
+    """Процесс-воркер с собственной копией модели XTTS"""
+
+    def __init__(self, worker_id: int, num_threads: int, cpu_ids):
+        self.worker_id = worker_id
+        self.num_threads = num_threads
+        self.cpu_ids = cpu_ids
+        self.executor = None
+        self.state = "loading"
+        self.current_tasks = []
+        self.helping = None  # длинное задание другого воркера, чьи сегменты синтезирует этот
+        self.tasks_done = 0
+        self.recycles = 0
+        self.broken = False  # процесс воркера завершился аварийно (например, его убил OOM killer)
+        self.latents = {}  # сводка кэша латентов голосов из последнего ответа воркера
+
+    @property
+    def is_idle(self) -> bool:
+        return self.state == "idle"
+
+    def start(self, config):
+        """Запускает процесс-воркер; модель загружается в его инициализаторе"""
+        self.state = "loading"
+        self.broken = False
+        self.latents = {}
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=tts_engine.init_worker,
+            initargs=(config, self.num_threads, self.cpu_ids)
+        )
+        return self.executor.submit(tts_engine.worker_ready)
+
+    def submit(self, fn, *args):
+        try:
+            future = self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self.broken = True
+            raise
+        future.add_done_callback(self._check_broken)
+        return future
+
+    def _check_broken(self, future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self.broken = True
+
+    def assign(self, tasks: list):
+        """Отдает воркеру одно задание или пакет заданий для совместного синтеза"""
+        self.state = "busy"
+        self.current_tasks = list(tasks)
+
+    def assign_segments(self, task):
+        """Подключает воркер к сегментам длинного задания другого воркера.
+
+        Задание остается за своим воркером: в current_tasks помощника оно не попадает
+        и в выполненные им не засчитывается.
+        """
+        self.state = "busy"
+        self.helping = task
+
+    def release(self):
+        self.state = "idle"
+        self.tasks_done += len(self.current_tasks)
+        self.current_tasks = []
+        self.helping = None
+
+    def restart(self, config):
+        """Перезапускает процесс воркера вместе с моделью, дождавшись завершения текущей работы"""
+        self.state = "recycling"
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        self.recycles += 1
+        return self.start(config)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SynthesisPool:
+    """Пул процессов синтеза, ядра хоста делятся между воркерами"""
+
+    def __init__(self, config):
+        self.config = config
+        self.workers = []
+
+    def _plan_workers(self):
+        """Распределяет доступные ядра и потоки torch между воркерами"""
+        count = max(1, self.config.synthesis_workers)
+
+        if hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+
+        threads = self.config.torch_threads_per_worker or max(1, len(cpus) // count)
+
+        plan = []
+        for worker_id in range(count):
+            # Воркеру достается непрерывный отрезок ядер; если ядер не хватает, не привязываем
+            cpu_ids = cpus[worker_id * threads:(worker_id + 1) * threads]
+            if len(cpu_ids) < threads:
+                cpu_ids = None
+            plan.append((worker_id + 1, threads, cpu_ids))
+        return plan
+
+    def launch(self) -> list:
+        """Запускает процессы воркеров, не дожидаясь загрузки моделей.
+
+        Возвращает пары (воркер, future готовности); по завершении future
+        воркер переводится в рабочее состояние через finish_start().
+        """
+        pending = []
+        for worker_id, threads, cpu_ids in self._plan_workers():
+            worker = SynthesisWorker(worker_id, threads, cpu_ids)
+            self.workers.append(worker)
+            pending.append((worker, worker.start(self.config)))
+            logger.info("Запущен воркер синтеза", extra={
+                "worker_id": worker_id, "threads": threads, "cpus": cpu_ids or "all"
+            })
+        return pending
+
+    def finish_start(self, worker, future):
+        """Отмечает воркер готовым по завершенной загрузке; возвращает замеры запуска или None"""
+        try:
+            info = future.result()
+            worker.state = "idle"
+            logger.info("Воркер синтеза готов", extra={
+                "worker_id": worker.worker_id, "pid": info["pid"],
+                "load": round(info.get("load", 0.0), 2), "warmup": round(info.get("warmup", 0.0), 2)
+            })
+            return info
+        except Exception as e:
+            worker.state = "error"
+            logger.error("Ошибка запуска воркера синтеза: %s", e, extra={"worker_id": worker.worker_id})
+            return None
+
+    def start(self) -> list:
+        """Запускает все воркеры и ждет загрузки моделей; возвращает замеры запуска готовых воркеров"""
+        infos = [self.finish_start(worker, future) for worker, future in self.launch()]
+
+        if not any(worker.is_idle for worker in self.workers):
+            raise RuntimeError("Не удалось запустить ни одного воркера синтеза")
+        return [info for info in infos if info]
+
+    def get_idle_worker(self):
+        for worker in self.workers:
+            if worker.is_idle:
+                return worker
+        return None
+
+    def busy_workers(self):
+        return [worker for worker in self.workers if worker.state == "busy"]
+
+    def busy_tasks(self) -> list:
+        """Задания, которые сейчас генерируются всеми воркерами"""
+        return [task for worker in self.busy_workers() for task in worker.current_tasks]
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.shutdown()
@@ -0,0 +1,343 @@
+import os
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+from text_processing import normalize_for_speech
+
+
+class AudioTask:
+    """Класс для хранения задания на генерацию аудио.
+
+    Хранит только идентификаторы чата и сообщений, а не объекты Update,
+    поэтому задание можно сохранить в базе и продолжить после перезапуска.
+    """
+    def __init__(self, text, chat_id, message_id, user_id, user_name,
+                 status_message_id=None, created_at=None, cache_key=None, task_id=None, attempts=0, voice=None,
+                 started_at=None):
+        self.task_id = task_id
+        self.text = text
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.status_message_id = status_message_id
+        self.created_at = created_at or datetime.now()
+        self.cache_key = cache_key
+        self.attempts = attempts
+        self.voice = voice  # имя голоса из реестра; None — голос по умолчанию
+        self.started_at = started_at  # когда задание выдано воркеру
+
+
+def fair_order(tasks: list, last_served: dict) -> list:
+    """Round-robin по пользователям: первым идет тот, кого обслуживали давнее всех (или никогда).
+
+    tasks должны быть упорядочены по task_id; внутри пользователя сохраняется FIFO.
+    """
+    per_user = {}
+    for task in tasks:
+        per_user.setdefault(task.user_id, []).append(task)
+
+    users = sorted(per_user, key=lambda user_id: (last_served.get(user_id, 0.0), per_user[user_id][0].task_id))
+
+    ordered = []
+    round_idx = 0
+    while len(ordered) < len(tasks):
+        for user_id in users:
+            if round_idx < len(per_user[user_id]):
+                ordered.append(per_user[user_id][round_idx])
+        round_idx += 1
+    return ordered
+
+
+def pick_batch(ordered: list, max_size: int, max_chars: int, bucket_chars: int) -> list:
+    """Пакет из первого по порядку задания и ожидающих заданий из той же корзины длины.
+
+    Длина считается по произносимому тексту: в воркер уходит он, а числа
+    и сокращения после раскрытия заметно длиннее исходника.
+    """
+    batch = [ordered[0]]
+    first_length = len(normalize_for_speech(ordered[0].text))
+    if first_length <= max_chars:
+        bucket = first_length // bucket_chars
+        for task in ordered[1:]:
+            if len(batch) >= max_size:
+                break
+            length = len(normalize_for_speech(task.text))
+            if length <= max_chars and length // bucket_chars == bucket:
+                batch.append(task)
+    return batch
+
+
+class TaskStore:
+    """Надежная очередь заданий на SQLite со справедливым планированием по пользователям.
+
+    Состояния задания: new (добавлено, статусное сообщение еще не отправлено),
+    pending (ждет воркера), running (генерируется). Выполненные задания удаляются.
+    Порядок выдачи — round-robin по пользователям: первым обслуживается тот,
+    кого обслуживали давнее всех, внутри пользователя задания идут по FIFO.
+
+    Выданное задание арендуется узлом node_id на lease_seconds; узел продлевает
+    аренду, пока генерирует, и подтверждает выполнение через complete(). Задания
+    с истекшей арендой (узел упал) возвращаются в очередь, пока не исчерпано
+    max_attempts попыток. Файл базы может быть общим для нескольких процессов
+    на одной машине; для нескольких машин есть RedisTaskStore с тем же интерфейсом.
+    """
+
+    # Локальный файл: бот обращается к очереди прямо из цикла событий, соединение привязано к его потоку
+    remote = False
+
+    _COLUMNS = ("id, text, chat_id, message_id, user_id, user_name, "
+                "status_message_id, created_at, cache_key, attempts, voice, started_at")
+
+    def __init__(self, path: str, node_id: str = "local", lease_seconds: float = 600.0, max_attempts: int = 3):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Базу могут одновременно открывать фронтенд и узлы-воркеры: ждем блокировку, а не падаем
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " text TEXT NOT NULL,"
+            " chat_id INTEGER NOT NULL,"
+            " message_id INTEGER NOT NULL,"
+            " user_id INTEGER NOT NULL,"
+            " user_name TEXT NOT NULL,"
+            " status_message_id INTEGER,"
+            " created_at REAL NOT NULL,"
+            " cache_key TEXT,"
+            " state TEXT NOT NULL,"
+            " started_at REAL)"
+        )
+        self._add_missing_columns({
+            "attempts": "INTEGER NOT NULL DEFAULT 0", "leased_by": "TEXT", "lease_until": "REAL", "voice": "TEXT"
+        })
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS user_service ("
+            " user_id INTEGER PRIMARY KEY,"
+            " last_served REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            " node_id TEXT PRIMARY KEY,"
+            " last_seen REAL NOT NULL,"
+            " info TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state)")
+        self.db.commit()
+
+    def _add_missing_columns(self, columns: dict):
+        """Добавляет новые колонки в базу, созданную до их появления"""
+        existing = {row[1] for row in self.db.execute("PRAGMA table_info(tasks)")}
+        for name, definition in columns.items():
+            if name not in existing:
+                self.db.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+
+    def _row_to_task(self, row) -> AudioTask:
+        return AudioTask(
+            task_id=row[0], text=row[1], chat_id=row[2], message_id=row[3],
+            user_id=row[4], user_name=row[5], status_message_id=row[6],
+            created_at=datetime.fromtimestamp(row[7]), cache_key=row[8], attempts=row[9], voice=row[10],
+            started_at=datetime.fromtimestamp(row[11]) if row[11] else None
+        )
+
+    def add(self, task: AudioTask) -> int:
+        """Сохраняет новое задание; планировщик увидит его после activate().
+
+        До активации задание помечено добавившим его узлом: если узел упадет,
+        не отправив статус, задание вернет в очередь только его recover().
+        """
+        cursor = self.db.execute(
+            "INSERT INTO tasks (text, chat_id, message_id, user_id, user_name, "
+            "status_message_id, created_at, cache_key, voice, leased_by, state)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'new')",
+            (task.text, task.chat_id, task.message_id, task.user_id, task.user_name,
+             task.status_message_id, task.created_at.timestamp(), task.cache_key, task.voice, self.node_id)
+        )
+        self.db.commit()
+        task.task_id = cursor.lastrowid
+        return task.task_id
+
+    def activate(self, task: AudioTask):
+        """Запоминает статусное сообщение и делает задание доступным планировщику"""
+        self.db.execute(
+            "UPDATE tasks SET status_message_id = ?, state = 'pending', leased_by = NULL WHERE id = ?",
+            (task.status_message_id, task.task_id)
+        )
+        self.db.commit()
+
+    def recover(self) -> int:
+        """После перезапуска узла возвращает в очередь его прерванные задания.
+
+        Задания, добавленные или арендованные другими узлами, не трогаем:
+        неактивированные еще активирует добавивший узел, арендованные вернутся
+        в очередь сами, если аренда истечет.
+        """
+        cursor = self.db.execute(
+            "UPDATE tasks SET state = 'pending', started_at = NULL, leased_by = NULL, lease_until = NULL"
+            " WHERE state IN ('new', 'running') AND (leased_by = ? OR leased_by IS NULL)",
+            (self.node_id,)
+        )
+        self.db.commit()
+        return cursor.rowcount
+
+    def ordered_pending(self, include_task_id: int = None) -> list:
+        """Ожидающие задания в порядке, в котором их выдаст планировщик"""
+        rows = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM tasks"
+            " WHERE state = 'pending' OR id = ? ORDER BY id",
+            (include_task_id,)
+        ).fetchall()
+        last_served = dict(self.db.execute("SELECT user_id, last_served FROM user_service"))
+        return fair_order([self._row_to_task(row) for row in rows], last_served)
+
+    def _claim(self, pick) -> list:
+        """Выбирает задания функцией pick и арендует их в одной транзакции.
+
+        BEGIN IMMEDIATE не дает двум процессам выдать одно задание дважды.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            ordered = self.ordered_pending()
+            tasks = pick(ordered) if ordered else []
+            now = time.time()
+            for task in tasks:
+                task.attempts += 1
+                task.started_at = datetime.fromtimestamp(now)
+                self.db.execute(
+                    "UPDATE tasks SET state = 'running', started_at = ?, attempts = ?,"
+                    " leased_by = ?, lease_until = ? WHERE id = ?",
+                    (now, task.attempts, self.node_id, now + self.lease_seconds, task.task_id)
+                )
+                self.db.execute(
+                    "INSERT OR REPLACE INTO user_service (user_id, last_served) VALUES (?, ?)",
+                    (task.user_id, now)
+                )
+            self.db.commit()
+            return tasks
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def claim_next(self):
+        """Выдает следующее по справедливому порядку задание и помечает его выполняемым"""
+        tasks = self._claim(lambda ordered: ordered[:1])
+        return tasks[0] if tasks else None
+
+    def claim_batch(self, max_size: int, max_chars: int, bucket_chars: int) -> list:
+        """Выдает пакет заданий близкой длины для совместного синтеза.
+
+        Пакет начинается со следующего по справедливому порядку задания и
+        дополняется ожидающими заданиями из той же корзины длины (len // bucket_chars),
+        чтобы паддинг в пакете был минимальным. Тексты длиннее max_chars идут поодиночке.
+        """
+        return self._claim(lambda ordered: pick_batch(ordered, max_size, max_chars, bucket_chars))
+
+    def extend_leases(self, task_ids: list):
+        """Продлевает аренду заданий, которые узел еще генерирует"""
+        lease_until = time.time() + self.lease_seconds
+        self.db.executemany(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND leased_by = ?",
+            [(lease_until, task_id, self.node_id) for task_id in task_ids]
+        )
+        self.db.commit()
+
+    def requeue_expired(self) -> list:
+        """Возвращает в очередь задания с истекшей арендой.
+
+        Задания, исчерпавшие max_attempts, удаляются и возвращаются вызывающему,
+        чтобы он сообщил пользователю об ошибке.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.db.execute(
+                f"SELECT {self._COLUMNS} FROM tasks WHERE state = 'running' AND lease_until < ?",
+                (time.time(),)
+            ).fetchall()
+            failed = []
+            for row in rows:
+                task = self._row_to_task(row)
+                if task.attempts >= self.max_attempts:
+                    self.db.execute("DELETE FROM tasks WHERE id = ?", (task.task_id,))
+                    failed.append(task)
+                else:
+                    self.db.execute(
+                        "UPDATE tasks SET state = 'pending', started_at = NULL, leased_by = NULL,"
+                        " lease_until = NULL WHERE id = ?",
+                        (task.task_id,)
+                    )
+            self.db.commit()
+            return failed
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def requeue(self, task: AudioTask) -> bool:
+        """Возвращает в очередь задание, прерванное падением воркера этого узла.
+
+        Если попытки исчерпаны, задание удаляется и возвращается False,
+        чтобы вызывающий сообщил пользователю об ошибке.
+        """
+        if task.attempts >= self.max_attempts:
+            self.complete(task)
+            return False
+        self.db.execute(
+            "UPDATE tasks SET state = 'pending', started_at = NULL, leased_by = NULL, lease_until = NULL"
+            " WHERE id = ? AND leased_by = ?",
+            (task.task_id, self.node_id)
+        )
+        self.db.commit()
+        return True
+
+    def oldest_pending_age(self) -> float:
+        """Сколько секунд ждет самое старое задание в очереди"""
+        oldest = self.db.execute("SELECT MIN(created_at) FROM tasks WHERE state = 'pending'").fetchone()[0]
+        return time.time() - oldest if oldest else 0.0
+
+    def complete(self, task: AudioTask):
+        """Подтверждает выполнение: задание удаляется из очереди"""
+        self.db.execute("DELETE FROM tasks WHERE id = ?", (task.task_id,))
+        self.db.commit()
+
+    def remove(self, task: AudioTask):
+        """Удаляет задание, которое так и не попало в очередь"""
+        self.complete(task)
+
+    def count_pending(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM tasks WHERE state = 'pending'").fetchone()[0]
+
+    def running_tasks(self) -> list:
+        """Задания, которые сейчас генерируются на любом узле"""
+        rows = self.db.execute(f"SELECT {self._COLUMNS} FROM tasks WHERE state = 'running' ORDER BY id").fetchall()
+        return [self._row_to_task(row) for row in rows]
+
+    def count_running(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM tasks WHERE state = 'running'").fetchone()[0]
+
+    def count_user_active(self, user_id: int) -> int:
+        """Сколько заданий пользователя ждут или генерируются"""
+        return self.db.execute(
+            "SELECT COUNT(*) FROM tasks WHERE user_id = ? AND state IN ('new', 'pending', 'running')",
+            (user_id,)
+        ).fetchone()[0]
+
+    def heartbeat(self, info: dict):
+        """Сообщает о живости узла и состоянии его воркеров"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO nodes (node_id, last_seen, info) VALUES (?, ?, ?)",
+            (self.node_id, time.time(), json.dumps(info, ensure_ascii=False))
+        )
+        self.db.commit()
+
+    def nodes(self) -> list:
+        """Все известные узлы: (node_id, секунд с последнего heartbeat, info)"""
+        now = time.time()
+        return [
+            (node_id, now - last_seen, json.loads(info))
+            for node_id, last_seen, info in self.db.execute("SELECT node_id, last_seen, info FROM nodes ORDER BY node_id")
+        ]
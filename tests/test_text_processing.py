@@ -0,0 +1,83 @@
+import pytest
+
+import text_processing
+from text_processing import normalize_for_speech, split_sentences
+
+
+@pytest.fixture(autouse=True)
+def digits_as_is(monkeypatch):
+    # num2words необязателен; без него числа остаются цифрами, и проверки не зависят от окружения
+    monkeypatch.setattr(text_processing, "HAS_NUM2WORDS", False)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("ул. Ленина 5", "улица Ленина 5"),
+    ("см. выше", "смотри выше"),
+    ("Это т.е. пример", "Это то есть пример"),
+    ("Яблоки, груши и т.д. Потом", "Яблоки, груши и так далее. Потом"),
+    ("Яблоки и т.д., а также груши", "Яблоки и так далее, а также груши"),
+    ("Цена 25 руб.", "Цена 25 рублей."),
+    ("Было 50 коп. Это немного", "Было 50 копеек. Это немного"),
+    ("Стоит 5 руб., а не 6", "Стоит 5 рублей, а не 6"),
+    ("5 млн. рублей", "5 миллионов рублей"),
+    ("5 млн рублей", "5 миллионов рублей"),
+    ("Итого 5 млрд. Дальше", "Итого 5 миллиардов. Дальше"),
+])
+def test_abbreviations(text, expected):
+    assert normalize_for_speech(text) == expected
+
+
+@pytest.mark.parametrize("text", ["Мой руб", "Коп и тыс", "смотрите"])
+def test_undotted_words_are_kept(text):
+    assert normalize_for_speech(text) == text
+
+
+def test_percent_number_sign_and_whitespace():
+    assert normalize_for_speech("Рост 5%  за\nгод, дом №7") == "Рост 5 процентов за год, дом номер 7"
+
+
+def test_split_sentences_empty():
+    assert split_sentences("") == []
+    assert split_sentences("   ") == []
+
+
+def test_short_sentences_are_merged():
+    text = "Да. Нет. Это длинное предложение, которое точно длиннее двадцати символов."
+    assert split_sentences(text) == [text]
+
+
+def test_long_sentence_is_split_by_clauses():
+    text = ("Первая часть длинного предложения, вторая часть длинного предложения, "
+            "третья часть длинного предложения, четвертая часть.")
+    segments = split_sentences(text, max_chars=60)
+    assert segments == [
+        "Первая часть длинного предложения,",
+        "вторая часть длинного предложения,",
+        "третья часть длинного предложения, четвертая часть.",
+    ]
+
+
+def test_clause_without_punctuation_is_split_by_words():
+    text = " ".join(["слово"] * 50)
+    segments = split_sentences(text, max_chars=40)
+    assert all(len(segment) <= 40 for segment in segments)
+    assert " ".join(segments) == text
+
+
+def test_oversized_token_is_hard_split():
+    assert [len(segment) for segment in split_sentences("а" * 400, max_chars=180)] == [180, 180, 40]
+
+
+def test_segments_never_exceed_limit():
+    text = "Короткое. " + "б" * 300 + " и еще немного слов после длинного токена."
+    segments = split_sentences(text, max_chars=100)
+    assert all(len(segment) <= 100 for segment in segments)
+    assert "".join(segments).replace(" ", "") == text.replace(" ", "")
+
+
+def test_normalized_dotted_abbreviation_does_not_split_sentence():
+    text = normalize_for_speech("Было 5 млн. рублей на счете у компании. Потом стало больше, чем ожидали все.")
+    assert split_sentences(text) == [
+        "Было 5 миллионов рублей на счете у компании.",
+        "Потом стало больше, чем ожидали все.",
+    ]
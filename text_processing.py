@@ -0,0 +1,131 @@
+import re
+
+# num2words ставится вместе с TTS; без него числа остаются цифрами и их разворачивает токенизатор XTTS
+try:
+    from num2words import num2words
+    HAS_NUM2WORDS = True
+except ImportError:
+    HAS_NUM2WORDS = False
+
+# Конец предложения: знак препинания (с возможными кавычками/скобками) и пробел
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?…])["»)\]]*\s+')
+# Внутри длинного предложения режем по границам клауз
+_CLAUSE_END_RE = re.compile(r'(?<=[,;:—])\s+')
+# Сегмент короче обычного предложения XTTS читает обрывками с неестественной интонацией
+MIN_SEGMENT_CHARS = 60
+
+
+# Сокращения, которые читаются словами и без раскрытия ломают разбиение на предложения.
+# Третье поле — сокращение может закончить предложение (единицы после чисел, «и т.д.»):
+# точка остается в конце текста и перед заглавной буквой, а перед строчной буквой, цифрой
+# или знаком препинания она часть сокращения. После остальных (ул., см. …) заглавная
+# буква — обычно имя собственное, и точка всегда уходит вместе с сокращением.
+_ABBREVIATIONS = [
+    (r'т\.\s?е\.', 'то есть', False),
+    (r'т\.\s?к\.', 'так как', False),
+    (r'т\.\s?д\.', 'так далее', True),
+    (r'т\.\s?п\.', 'тому подобное', True),
+    (r'и\s др\.', 'и другие', True),
+    (r'напр\.', 'например', False),
+    (r'см\.', 'смотри', False),
+    (r'ул\.', 'улица', False),
+    (r'руб\.', 'рублей', True),
+    (r'коп\.', 'копеек', True),
+    (r'тыс\.', 'тысяч', True),
+    # Обычно пишутся без точки, но встречаются и с ней
+    (r'млн\.?', 'миллионов', True),
+    (r'млрд\.?', 'миллиардов', True),
+]
+_ABBREVIATION_RES = [
+    (re.compile(rf'(?<!\w){pattern}(?!\w)', re.IGNORECASE), replacement, can_end_sentence)
+    for pattern, replacement, can_end_sentence in _ABBREVIATIONS
+]
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+_NEXT_SENTENCE_RE = re.compile(r'\s+[A-ZА-ЯЁ]')
+
+
+def _number_to_words(match) -> str:
+    number = match.group(0).replace(',', '.')
+    try:
+        value = float(number) if '.' in number else int(number)
+        return num2words(value, lang='ru')
+    except (ValueError, NotImplementedError, OverflowError):
+        return match.group(0)
+
+
+def normalize_for_speech(text: str) -> str:
+    """Приводит текст к произносимому виду: раскрывает сокращения, проценты и числа"""
+    text = text.replace('\n', ' ').replace('\r', ' ')
+    for regex, replacement, can_end_sentence in _ABBREVIATION_RES:
+        def expand(match, replacement=replacement, can_end_sentence=can_end_sentence):
+            # Сокращение в конце предложения забирает точку — возвращаем ее в конце текста
+            # и перед заглавной буквой, если сокращение может закончить предложение
+            rest = match.string[match.end():]
+            ends_sentence = match.group(0).endswith('.') and (
+                not rest.strip() or (can_end_sentence and _NEXT_SENTENCE_RE.match(rest))
+            )
+            return replacement + ('.' if ends_sentence else '')
+        text = regex.sub(expand, text)
+    text = re.sub(r'(\d)\s?%', r'\1 процентов', text).replace('№', 'номер ')
+    if HAS_NUM2WORDS:
+        text = _NUMBER_RE.sub(_number_to_words, text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _split_long(sentence: str, max_chars: int) -> list:
+    """Режет слишком длинное предложение по клаузам, при необходимости по словам и внутри слов"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+
+    parts = []
+    current = ""
+    for piece in _CLAUSE_END_RE.split(sentence):
+        if len(piece) > max_chars:
+            # Клауза без знаков препинания — режем по словам, а слишком длинные слова — жестко
+            for word in piece.split():
+                if current and len(current) + 1 + len(word) > max_chars:
+                    parts.append(current)
+                    current = ""
+                while len(word) > max_chars:
+                    parts.append(word[:max_chars])
+                    word = word[max_chars:]
+                current = f"{current} {word}" if current else word
+            continue
+        if current and len(current) + 1 + len(piece) > max_chars:
+            parts.append(current)
+            current = ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_sentences(text: str, max_chars: int = 180, min_chars: int = 20) -> list:
+    """Разбивает текст на предложения для поочередного синтеза.
+
+    Короткие предложения склеиваются с соседними (XTTS плохо звучит на
+    обрывках), длинные режутся так, чтобы не превышать max_chars.
+    """
+    text = text.replace('\n', ' ').replace('\r', ' ').strip()
+    if not text:
+        return []
+
+    chunks = []
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        if sentence:
+            chunks.extend(_split_long(sentence, max_chars))
+
+    merged = []
+    for chunk in chunks:
+        if merged and len(merged[-1]) < min_chars and len(merged[-1]) + 1 + len(chunk) <= max_chars:
+            merged[-1] = f"{merged[-1]} {chunk}"
+        else:
+            merged.append(chunk)
+
+    # Хвостовой обрывок присоединяем к предыдущему предложению
+    if len(merged) > 1 and len(merged[-1]) < min_chars and len(merged[-2]) + 1 + len(merged[-1]) <= max_chars:
+        tail = merged.pop()
+        merged[-1] = f"{merged[-1]} {tail}"
+
+    return merged
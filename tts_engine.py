@@ -0,0 +1,502 @@
+import os
+import gc
+import time
+import logging
+import zlib
+import hashlib
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+
+from audio_encoding import encode_ogg_opus, to_float32, write_wav
+from memory_governor import PeakRssSampler, current_rss_mb, release_memory
+from speaker_latents import SpeakerLatentsCache, VoiceLatents
+from structured_logging import setup_logging
+from voice_registry import VoiceRegistry
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+LANGUAGE = "ru"
+
+
+def model_version() -> str:
+    """Версия модели для ключей кэшей; не требует импорта TTS"""
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        return f"{MODEL_NAME}@{version('TTS')}"
+    except PackageNotFoundError:
+        return MODEL_NAME
+
+
+@dataclass
+class SynthesisResult:
+    """Результат синтеза, возвращаемый из процесса-воркера.
+
+    В режиме voice аудио передается в памяти (audio_data, OGG/Opus),
+    в режиме wav_file — путем к WAV во временном каталоге.
+    """
+    audio_path: str = None
+    audio_data: bytes = None
+    kind: str = "audio"
+    audio_duration: float = 0.0
+    timings: dict = field(default_factory=dict)
+    memory: dict = field(default_factory=dict)  # RSS воркера в МБ: before, peak, after
+    latents: dict = field(default_factory=dict)  # сводка VoiceLatents воркера после синтеза
+    profile: dict = field(default_factory=dict)  # каталог и этапы профиля, если задание профилировалось
+    wav: np.ndarray = None  # некодированная волна сегмента длинного текста
+    sample_rate: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.audio_path or self.audio_data)
+
+    @property
+    def payload_size(self) -> int:
+        if self.audio_data:
+            return len(self.audio_data)
+        if self.audio_path and os.path.exists(self.audio_path):
+            return os.path.getsize(self.audio_path)
+        return 0
+
+
+def encode_audio(config, wav, sample_rate: int, result: SynthesisResult):
+    """Кодирует волну в формат выдачи и замеряет время кодирования.
+
+    Вызывается в воркере для обычных заданий и в основном процессе для
+    склеенных сегментов длинного текста.
+    """
+    encode_start = time.perf_counter()
+    result.audio_duration = len(wav) / sample_rate
+
+    if config.audio_output == "wav_file":
+        _write_wav_file(wav, sample_rate, result)
+    else:
+        # Кодируем прямо из памяти, минуя временные файлы
+        result.audio_data = encode_ogg_opus(wav, sample_rate, config.opus_bitrate)
+        result.kind = "voice"
+    result.timings["encode"] = time.perf_counter() - encode_start
+
+
+def _write_wav_file(wav, sample_rate: int, result: SynthesisResult):
+    """Запись WAV во временный каталог (режим wav_file)"""
+    os.makedirs("temp_audio", exist_ok=True)
+    # Несколько воркеров могут писать файлы в одну секунду, поэтому добавляем случайный суффикс
+    filename = os.path.join(
+        "temp_audio",
+        f"audio_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.wav"
+    )
+
+    write_wav(filename, wav, sample_rate)
+
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        logger.error("Файл %s не создан или пустой", filename)
+        return
+
+    result.audio_path = filename
+    result.kind = "audio"
+
+
+class TTSEngine:
+    """Модель XTTS вместе с латентами голосов, живет внутри процесса-воркера"""
+
+    def __init__(self, config):
+        self.config = config
+        self.tts = None
+        self.voices = None
+        self.latents = None
+
+    def load(self):
+        """Загрузка TTS модели"""
+        from TTS.api import TTS
+
+        logger.info("Загрузка TTS модели для CPU")
+
+        self.voices = VoiceRegistry(
+            self.config.voices_dir, self.config.path_default_sempl_voice, self.config.default_voice
+        )
+        if not os.path.exists(self.config.path_default_sempl_voice):
+            logger.error("Файл с голосом %s не найден", self.config.path_default_sempl_voice)
+            raise FileNotFoundError(f"Файл с голосом {self.config.path_default_sempl_voice} не найден")
+
+        gc.collect()
+
+        # Минимальная инициализация TTS
+        self.tts = TTS(
+            model_name=MODEL_NAME,
+            progress_bar=False,
+            gpu=False
+        )
+
+        # Латенты голосов считаются один раз, кэшируются на диске и в памяти воркера (LRU)
+        self.latents = VoiceLatents(
+            SpeakerLatentsCache(self.config.latents_cache_dir, model_version()), self.config.voice_latents_cache_mb
+        )
+        _, speaker_embedding = self._voice_latents(None, prewarm=True)
+
+        # Оптимизации для CPU применяем после расчета латентов голоса по умолчанию:
+        # экспорт декодера в ONNX берет из них speaker_embedding
+        if self.config.inference_precision != "fp32" or self.config.hifigan_backend != "torch":
+            from inference_optim import apply_inference_optimizations
+            model_key = hashlib.sha256(model_version().encode('utf-8')).hexdigest()[:16]
+            apply_inference_optimizations(
+                self.tts.synthesizer.tts_model, self.config, speaker_embedding, model_key
+            )
+            # Квантованные энкодеры дают другие латенты: все голоса, включая голос по умолчанию,
+            # кодируются квантованной моделью и кэшируются отдельно от fp32
+            if self.config.inference_precision != "fp32":
+                self.latents = VoiceLatents(
+                    SpeakerLatentsCache(
+                        self.config.latents_cache_dir, f"{model_version()}+{self.config.inference_precision}"
+                    ),
+                    self.config.voice_latents_cache_mb
+                )
+                self._voice_latents(None, prewarm=True)
+
+        logger.info("TTS модель успешно загружена и готова к использованию")
+
+    def _voice_latents(self, voice: str, prewarm: bool = False):
+        """(gpt_cond_latent, speaker_embedding) голоса; None — голос по умолчанию"""
+        name = self.voices.canonical(voice)
+        if name is None:
+            raise ValueError(f"Неизвестный голос: {voice}")
+        model = self.tts.synthesizer.tts_model
+        if prewarm:
+            self.latents.prewarm(model, name, self.voices.paths[name])
+            return self.latents.entries[name][1]
+        return self.latents.get(model, name, self.voices.paths[name])
+
+    def prewarm_voices(self, voices: list):
+        """Загружает латенты голосов из ближайших заданий очереди до того, как они понадобятся"""
+        for voice in voices:
+            try:
+                self._voice_latents(voice, prewarm=True)
+            except Exception as e:
+                logger.warning("Не удалось подготовить латенты голоса %s: %s", voice, e)
+
+    def latents_info(self) -> dict:
+        return self.latents.info() if self.latents else {}
+
+    def warm_up(self, text: str):
+        """Пробный синтез: первые вызовы платят за инициализацию аллокатора и ядер torch"""
+        self._synthesize(text)
+
+    def generate_audio(self, text: str, task_id: int = None, voice: str = None) -> SynthesisResult:
+        """Генерация аудио с замером длительности синтеза и кодирования"""
+        result = SynthesisResult()
+        try:
+            if len(text) > self.config.max_text_length:
+                text = text[:self.config.max_text_length]
+
+            text = text.replace('\n', ' ').replace('\r', ' ')
+
+            logger.info("Начало генерации", extra={
+                "task_id": task_id, "pid": os.getpid(), "chars": len(text), "voice": voice
+            })
+
+            synthesis_start = time.perf_counter()
+            wav, sample_rate = self._synthesize(text, voice)
+            result.timings["synthesis"] = time.perf_counter() - synthesis_start
+
+            self._encode_result(wav, sample_rate, result)
+            return result
+        except Exception:
+            logger.exception("Ошибка генерации аудио", extra={"task_id": task_id})
+            return result
+
+    def generate_batch(self, texts: list, task_ids: list = None, voices: list = None) -> list:
+        """Совместная генерация нескольких коротких текстов одним проходом GPT.
+
+        Тексты пакета могут быть разными голосами. Возвращает SynthesisResult
+        в порядке текстов. При ошибке пакетного синтеза тексты генерируются
+        по одному, чтобы не потерять задания.
+        """
+        texts = [text.replace('\n', ' ').replace('\r', ' ') for text in texts]
+        task_ids = task_ids or [None] * len(texts)
+        voices = voices or [None] * len(texts)
+        if len(texts) == 1:
+            return [self.generate_audio(texts[0], task_ids[0], voices[0])]
+
+        try:
+            logger.info("Начало пакетной генерации", extra={"task_ids": task_ids, "pid": os.getpid()})
+            synthesis_start = time.perf_counter()
+            wavs, sample_rate = self._synthesize_batch(texts, voices)
+            synthesis_time = time.perf_counter() - synthesis_start
+
+            results = []
+            for wav in wavs:
+                result = SynthesisResult()
+                # Время синтеза общее для пакета: столько ждал каждый из пользователей
+                result.timings["synthesis"] = synthesis_time
+                self._encode_result(wav, sample_rate, result)
+                results.append(result)
+            return results
+        except Exception as e:
+            logger.warning("Ошибка пакетной генерации, генерирую по одному: %s", e, extra={"task_ids": task_ids})
+            return [
+                self.generate_audio(text, task_id, voice) for text, task_id, voice in zip(texts, task_ids, voices)
+            ]
+
+    def synthesize_segment(self, text: str, task_id: int = None, voice: str = None) -> SynthesisResult:
+        """Синтез сегмента длинного текста без кодирования: сегменты склеивает основной процесс"""
+        result = SynthesisResult()
+        try:
+            logger.info("Начало генерации сегмента", extra={
+                "task_id": task_id, "pid": os.getpid(), "chars": len(text), "voice": voice
+            })
+            synthesis_start = time.perf_counter()
+            wav, sample_rate = self._synthesize(text, voice)
+            result.timings["synthesis"] = time.perf_counter() - synthesis_start
+
+            result.wav = to_float32(wav)
+            result.sample_rate = sample_rate
+            result.audio_duration = len(result.wav) / sample_rate
+        except Exception:
+            logger.exception("Ошибка генерации сегмента", extra={"task_id": task_id})
+        return result
+
+    def _encode_result(self, wav, sample_rate: int, result: SynthesisResult):
+        encode_audio(self.config, wav, sample_rate, result)
+
+    def _synthesize(self, text: str, voice: str = None):
+        """Синтез волны; возвращает (wav, sample_rate)"""
+        import torch
+
+        # Используем заранее вычисленные латенты вместо повторного разбора образца голоса
+        gpt_cond_latent, speaker_embedding = self._voice_latents(voice)
+        with torch.inference_mode():
+            out = self.tts.synthesizer.tts_model.inference(
+                text=text,
+                language=LANGUAGE,
+                gpt_cond_latent=gpt_cond_latent,
+                speaker_embedding=speaker_embedding,
+                enable_text_splitting=True
+            )
+        return out["wav"], self.tts.synthesizer.output_sample_rate
+
+    def _synthesize_batch(self, texts: list, voices: list = None):
+        """Пакетный синтез: авторегрессия GPT идет сразу для всех текстов.
+
+        Текстовые токены дополняются стоп-токеном до общей длины, латенты
+        диктора каждого текста собираются в пакет. Латенты GPT и декодер HiFi-GAN
+        считаются по отдельности для каждого текста по его реальной длине.
+        Тексты должны укладываться в лимит одного предложения XTTS.
+        """
+        import torch
+
+        model = self.tts.synthesizer.tts_model
+        voice_latents = [self._voice_latents(voice) for voice in voices or [None] * len(texts)]
+        token_lists = [
+            model.tokenizer.encode(text.strip().lower(), lang=LANGUAGE) for text in texts
+        ]
+        batch_size = len(token_lists)
+        max_tokens = max(len(tokens) for tokens in token_lists)
+
+        text_tokens = torch.full((batch_size, max_tokens), model.gpt.stop_text_token, dtype=torch.int32)
+        for idx, tokens in enumerate(token_lists):
+            text_tokens[idx, :len(tokens)] = torch.IntTensor(tokens)
+
+        config = model.config
+        wavs = []
+        with torch.inference_mode():
+            gpt_codes = model.gpt.generate(
+                cond_latents=torch.cat([gpt_cond_latent for gpt_cond_latent, _ in voice_latents]),
+                text_inputs=text_tokens,
+                input_tokens=None,
+                do_sample=True,
+                top_p=config.top_p,
+                top_k=config.top_k,
+                temperature=config.temperature,
+                num_return_sequences=1,
+                num_beams=1,
+                length_penalty=config.length_penalty,
+                repetition_penalty=config.repetition_penalty,
+                output_attentions=False,
+            )
+
+            for idx, tokens in enumerate(token_lists):
+                gpt_cond_latent, speaker_embedding = voice_latents[idx]
+                codes = gpt_codes[idx:idx + 1]
+                # Завершившиеся раньше последовательности дополнены стоп-токеном — обрезаем хвост
+                stops = (codes[0] == model.gpt.stop_audio_token).nonzero()
+                if len(stops):
+                    codes = codes[:, :stops[0].item() + 1]
+
+                item_tokens = text_tokens[idx:idx + 1, :len(tokens)]
+                latents = model.gpt(
+                    item_tokens,
+                    torch.tensor([item_tokens.shape[-1]]),
+                    codes,
+                    torch.tensor([codes.shape[-1] * model.gpt.code_stride_len]),
+                    cond_latents=gpt_cond_latent,
+                    return_attentions=False,
+                    return_latent=True,
+                )
+                wav = model.hifigan_decoder(latents, g=speaker_embedding)
+                wavs.append(wav.cpu().squeeze().numpy())
+        return wavs, self.tts.synthesizer.output_sample_rate
+
+
+
+class FakeTTSEngine(TTSEngine):
+    """Быстрый детерминированный движок для нагрузочных тестов без модели.
+
+    Время синтеза и длительность аудио пропорциональны длине текста,
+    поэтому очередь, кодирование и доставка ведут себя как с настоящей моделью.
+    """
+
+    SAMPLE_RATE = 24000
+    AUDIO_SECONDS_PER_CHAR = 0.065  # примерно 15 символов речи в секунду
+    BATCH_MARGINAL_COST = 0.3  # доля времени синтеза, которую добавляет каждый следующий текст пакета
+
+    def load(self):
+        logger.info("Используется тестовый движок синтеза (fake)")
+
+    def _synthesize(self, text: str, voice: str = None):
+        time.sleep(len(text) / self.config.fake_tts_chars_per_second)
+        return self._tone(text, voice), self.SAMPLE_RATE
+
+    def _synthesize_batch(self, texts: list, voices: list = None):
+        # Модель пакетного выигрыша: самый длинный текст стоит полностью,
+        # остальные — долю BATCH_MARGINAL_COST от одиночного синтеза
+        longest = max(len(text) for text in texts)
+        rest = sum(len(text) for text in texts) - longest
+        time.sleep((longest + self.BATCH_MARGINAL_COST * rest) / self.config.fake_tts_chars_per_second)
+
+        voices = voices or [None] * len(texts)
+        return [self._tone(text, voice) for text, voice in zip(texts, voices)], self.SAMPLE_RATE
+
+    def prewarm_voices(self, voices: list):
+        pass  # латентов у тестового движка нет
+
+    def _tone(self, text: str, voice: str = None):
+        # Тон зависит от текста и голоса, чтобы одинаковые запросы давали одинаковое аудио
+        frequency = 150 + zlib.crc32(f"{voice or ''}\0{text}".encode('utf-8')) % 200
+        samples = int(len(text) * self.AUDIO_SECONDS_PER_CHAR * self.SAMPLE_RATE)
+        t = np.arange(samples, dtype=np.float32) / self.SAMPLE_RATE
+        return 0.3 * np.sin(2 * np.pi * frequency * t)
+
+
+ENGINES = {
+    "xtts": TTSEngine,
+    "fake": FakeTTSEngine,
+}
+
+
+def create_engine(config) -> TTSEngine:
+    return ENGINES[config.tts_backend](config)
+
+
+# Экземпляр движка внутри процесса-воркера, его конфигурация и длительность запуска
+_worker_engine = None
+_worker_config = None
+_worker_startup = {}
+
+
+def init_worker(config, num_threads: int, cpu_ids):
+    """Инициализатор процесса-воркера: настройка потоков torch и загрузка модели"""
+    global _worker_engine, _worker_config
+    setup_logging(config.log_format, config.log_level)
+    _worker_config = config
+
+    # Привязываем процесс к своей доле ядер, чтобы воркеры не мешали друг другу
+    if cpu_ids and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpu_ids)
+        except OSError as e:
+            logger.warning("Не удалось привязать воркер к ядрам %s: %s", cpu_ids, e)
+
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+        # Пул inter-op потоков задается до первой операции torch в процессе
+        if config.torch_interop_threads:
+            torch.set_num_interop_threads(config.torch_interop_threads)
+    except ImportError:
+        pass  # тестовому движку torch не нужен
+
+    load_start = time.perf_counter()
+    _worker_engine = create_engine(config)
+    _worker_engine.load()
+    _worker_startup["load"] = time.perf_counter() - load_start
+
+    # Прогрев до первого пользовательского задания
+    if config.warmup_text:
+        warmup_start = time.perf_counter()
+        try:
+            _worker_engine.warm_up(config.warmup_text)
+            _worker_startup["warmup"] = time.perf_counter() - warmup_start
+        except Exception as e:
+            logger.warning("Ошибка прогрева модели: %s", e)
+
+    # Базовый RSS после загрузки — от него считается запас памяти под синтез
+    if config.memory_governor_enabled:
+        release_memory()
+    _worker_startup["rss_mb"] = current_rss_mb()
+
+
+def worker_ready() -> dict:
+    """Пустое задание: завершается, когда инициализатор воркера отработал"""
+    return {"pid": os.getpid(), **_worker_startup}
+
+
+def _with_memory_tracking(generate, *args):
+    """Выполняет синтез с замером RSS до, во время и после и освобождает память после задания"""
+    if not _worker_config.memory_governor_enabled:
+        return generate(*args)
+
+    before = current_rss_mb()
+    with PeakRssSampler(_worker_config.memory_sample_interval) as sampler:
+        output = generate(*args)
+    release_memory()
+
+    memory = {"before": before, "peak": sampler.peak_mb, "after": current_rss_mb()}
+    for result in output if isinstance(output, list) else [output]:
+        result.memory = memory
+    return output
+
+
+def _with_latents_info(output):
+    """Прикладывает к результатам сводку кэша латентов голосов воркера"""
+    info = _worker_engine.latents_info()
+    for result in output if isinstance(output, list) else [output]:
+        result.latents = info
+    return output
+
+
+def _run_job(profile: str, label: str, generate, *args):
+    """Синтез с замером памяти; под профайлером — только если администратор его включил"""
+    if not profile:
+        return _with_latents_info(_with_memory_tracking(generate, *args))
+
+    from profiling import profile_call
+    model = _worker_engine.tts.synthesizer.tts_model if _worker_engine.tts else None
+    return _with_latents_info(profile_call(
+        profile, _worker_config.profile_dir, label, model, _worker_config.profile_sample_interval,
+        _with_memory_tracking, generate, *args
+    ))
+
+
+def worker_generate_audio(text: str, task_id: int = None, voice: str = None, profile: str = None) -> SynthesisResult:
+    """Генерация аудио движком текущего процесса-воркера; task_id нужен только для логов"""
+    return _run_job(profile, f"task{task_id}", _worker_engine.generate_audio, text, task_id, voice)
+
+
+def worker_synthesize_segment(text: str, task_id: int = None, voice: str = None,
+                              profile: str = None) -> SynthesisResult:
+    """Синтез сегмента длинного текста движком текущего процесса-воркера, без кодирования"""
+    return _run_job(profile, f"task{task_id}", _worker_engine.synthesize_segment, text, task_id, voice)
+
+
+def worker_generate_batch(texts: list, task_ids: list = None, voices: list = None, profile: str = None) -> list:
+    """Пакетная генерация движком текущего процесса-воркера"""
+    label = "batch" + "-".join(str(task_id) for task_id in task_ids or ())
+    return _run_job(profile, label, _worker_engine.generate_batch, texts, task_ids, voices)
+
+
+def worker_prewarm_voices(voices: list) -> dict:
+    """Подготовка латентов голосов между заданиями; возвращает сводку кэша латентов"""
+    _worker_engine.prewarm_voices(voices)
+    return _worker_engine.latents_info()
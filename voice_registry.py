@@ -0,0 +1,59 @@
+import logging
+import os
+
+from speaker_latents import file_sha256
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_EXTENSIONS = (".wav", ".flac", ".mp3", ".ogg")
+
+
+class VoiceRegistry:
+    """Реестр образцов голоса, сканируется при запуске.
+
+    Имя голоса — имя файла в voices_dir без расширения, в нижнем регистре.
+    Голос по умолчанию — path_default_sempl_voice под именем default_name.
+    Хэши образцов для ключей кэшей считаются при первом обращении.
+    """
+
+    def __init__(self, voices_dir: str, default_path: str, default_name: str = "default"):
+        self.voices_dir = voices_dir
+        self.default = default_name.lower()
+        self.paths = {self.default: default_path}
+        self._hashes = {}
+
+        if voices_dir and os.path.isdir(voices_dir):
+            for filename in sorted(os.listdir(voices_dir)):
+                name, ext = os.path.splitext(filename)
+                if ext.lower() in SAMPLE_EXTENSIONS and name.lower() not in self.paths:
+                    self.paths[name.lower()] = os.path.join(voices_dir, filename)
+        logger.info("Найдено голосов: %d", len(self.paths), extra={"voices_dir": voices_dir})
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def names(self) -> list:
+        return sorted(self.paths)
+
+    def canonical(self, name: str = None):
+        """Имя голоса в реестре или None, если такого голоса нет; без имени — голос по умолчанию"""
+        name = (name or self.default).lower()
+        return name if name in self.paths else None
+
+    def resolve(self, name: str = None):
+        """Путь к образцу голоса или None"""
+        name = self.canonical(name)
+        return self.paths[name] if name else None
+
+    def sample_hash(self, name: str = None):
+        """sha256 образца голоса или None, если файл недоступен"""
+        name = self.canonical(name)
+        if name is None:
+            return None
+        if name not in self._hashes:
+            try:
+                self._hashes[name] = file_sha256(self.paths[name])
+            except OSError as e:
+                logger.error("Не удалось прочитать образец голоса %s: %s", self.paths[name], e)
+                return None
+        return self._hashes[name]
@@ -0,0 +1,79 @@
+import asyncio
+import hmac
+import logging
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def create_webhook_app(application, bot_manager, config) -> web.Application:
+    """HTTP-приложение: прием обновлений от Telegram и проверки живости/готовности"""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        # Telegram передает secret_token из setWebhook в заголовке каждого запроса
+        if config.webhook_secret_token:
+            received = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(received, config.webhook_secret_token):
+                return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        # Обновление уходит в те же обработчики, что и при long polling
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def handle_ready(request: web.Request) -> web.Response:
+        # Готовы только после загрузки моделей в воркерах синтеза
+        if bot_manager.is_ready:
+            return web.json_response({"status": "ready"})
+        return web.json_response({"status": "loading"}, status=503)
+
+    app = web.Application()
+    app.router.add_post(config.webhook_path, handle_update)
+    app.router.add_get("/healthz", handle_health)
+    app.router.add_get("/readyz", handle_ready)
+    return app
+
+
+async def run_webhook(application, bot_manager, config):
+    """Запуск бота в режиме webhook на собственном асинхронном HTTP-сервере"""
+    runner = web.AppRunner(create_webhook_app(application, bot_manager, config))
+    await runner.setup()
+    site = web.TCPSite(runner, config.webhook_listen, config.webhook_port)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows: остановка по Ctrl+C через KeyboardInterrupt
+
+    async with application:
+        await application.start()
+        await bot_manager.startup(application.bot)
+        await site.start()
+
+        await application.bot.set_webhook(
+            url=config.webhook_url.rstrip("/") + config.webhook_path,
+            secret_token=config.webhook_secret_token or None,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info("Webhook-сервер слушает %s:%s%s", config.webhook_listen, config.webhook_port, config.webhook_path)
+
+        try:
+            await stop_event.wait()
+        finally:
+            await runner.cleanup()
+            await application.stop()
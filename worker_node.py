@@ -0,0 +1,32 @@
+import asyncio
+import logging
+import signal
+
+from telegram import Bot
+
+logger = logging.getLogger(__name__)
+
+
+async def run_worker_node(bot_manager, config):
+    """Запуск узла-воркера (role = worker): обновления Telegram не принимаются.
+
+    Узел загружает модели, забирает задания из общей очереди и сам отправляет
+    пользователю статус и готовое аудио через Bot API; /gen принимает фронтенд.
+    """
+    bot_kwargs = {}
+    if config.telegram_api_base_url:
+        bot_kwargs = {"base_url": config.telegram_api_base_url, "base_file_url": config.telegram_api_base_url}
+    bot = Bot(config.token, **bot_kwargs)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows: остановка по Ctrl+C через KeyboardInterrupt
+
+    async with bot:
+        await bot_manager.startup(bot)
+        logger.info("Узел-воркер подключен к очереди заданий", extra={"node_id": bot_manager.node_id, "broker": config.broker})
+        await stop_event.wait()